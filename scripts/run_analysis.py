@@ -6,14 +6,14 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
-import numpy as np
 import src.common as cmn
 import src.players as pl
 import src.analysis as ana
 
 # %%
 # 2. データ読み込み
-model: cmn.Model = np.load(PROJECT_ROOT / "data" / "artifacts" / "main_model.npz")
+model: cmn.Model = cmn.load_model_artifact("main")
+model_key = cmn.read_model_manifest("main")["hash"]
 stats_df = pl.load_stats_csv(PROJECT_ROOT / "data" / "examples" / "stats_2025_LAD.csv")
 
 # %%
@@ -26,7 +26,7 @@ batting_order = [
 
 lineup_df = pl.pick_lineup(stats_df, batting_order)
 lineup_probs = pl.convert_stats_to_probs(lineup_df)
-lineup_matrices = pl.build_lineup_matrices(model, lineup_probs)
+lineup_matrices = pl.build_lineup_matrices(model, lineup_probs, model_key)
 
 # ラインナップを表示
 print("=== Lineup ===")
@@ -50,10 +50,16 @@ stats_df_T = pl.load_stats_csv(PROJECT_ROOT / "data" / "examples" / "stats_2025_
 batting_order_T = ["Chikamoto", "Nakano", "Morishita", "Sato", "Ohyama", "Obata", "Sakamoto", "Maegawa", "Murakami"]
 lineup_df_T = pl.pick_lineup(stats_df_T, batting_order_T)
 lineup_probs_T = pl.convert_stats_to_probs(lineup_df_T)
-lineup_matrices_T = pl.build_lineup_matrices(model, lineup_probs_T)
+lineup_matrices_T = pl.build_lineup_matrices(model, lineup_probs_T, model_key)
 
 # 2番中野 0/1__ vs 3番森下 1/_2_
-runs_array_hitting = ana.simulate_states(lineup_matrices_T, batter_index=1, state="0/1__")
-ana.print_simulation_report(runs_array_hitting, batter="中野", state="0/1__")
-runs_array_bunting = ana.simulate_states(lineup_matrices_T, batter_index=2, state="1/_2_")
-ana.print_simulation_report(runs_array_bunting, batter="森下", state="1/_2_")
+# 共通乱数で2つの場面を対にしてシミュレーションし、差の信頼区間を求める
+comparison, _ = ana.compare_scenarios(lineup_matrices_T, [(1, "0/1__"), (2, "1/_2_")], rng=0)
+ana.print_comparison_report(comparison, labels=["中野 0/1__", "森下 1/_2_"])
+
+# %%
+# 7. 作戦の判断表
+# 打順 × 状態ごとに、送りバント・敬遠による得点期待値と得点確率の変化を一度に計算する
+strategy_model: cmn.Model = cmn.load_model_artifact("strategy", mapping=cmn.STRATEGY_MAPPING)
+strategy_table = ana.build_strategy_table(lineup_matrices_T, strategy_model, lineup_names=batting_order_T)
+print(strategy_table[strategy_table["strategy"] == "sac_bunt"].sort_values("delta_prob", ascending=False).head(10))
@@ -0,0 +1,182 @@
+# %%
+# 1. セットアップ
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+import numpy as np
+import pandas as pd
+import src.models as mdl
+import src.analysis as ana
+
+BENCHMARK_DIR = PROJECT_ROOT / "data" / "benchmarks"
+
+# %%
+# 2. 計測用の関数
+def measure(stage: str, scale: float, n_items: int, unit: str, func: Callable[[], Any], repeat: int = 1) -> tuple[dict, Any]:
+    # 実行時間はrepeat回の最小値、ピークメモリはtracemallocで別に1回計測する
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds = min(seconds, time.perf_counter() - start)
+        del result
+
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {
+        "stage": stage,
+        "scale": scale,
+        "n_items": n_items,
+        "unit": unit,
+        "seconds": seconds,
+        "throughput": n_items / seconds if seconds > 0 else None,
+        "peak_mib": peak / 2**20,
+    }
+    print(f"{stage:<28} scale={scale:<6} {seconds:9.4f}s  {record['throughput']:14.1f} {unit}/s  {record['peak_mib']:9.1f} MiB")
+    return record, result
+
+def build_lineup_tensor(model: dict, n_lineups: int, rng: np.random.Generator) -> np.ndarray:
+    # 打席結果の確率をランダムに揺らした選手で打順を作る
+    base_probs = np.array([0.14, 0.045, 0.004, 0.03, 0.09, 0.225, 0.466])
+    probs = rng.dirichlet(base_probs * 400, size=(n_lineups, 9))
+    model_tensor = np.stack([model[r] for r in model])
+    lineup_tensor = np.einsum("lpr,rij->lpij", probs, model_tensor)
+    return lineup_tensor / lineup_tensor.sum(axis=-1, keepdims=True)
+
+def run_data_benchmarks(seasons: float, seed: int) -> list[dict]:
+    records = []
+    raw_df = mdl.generate_synthetic_statcast(n_seasons=seasons, seed=seed)
+    n_rows = len(raw_df)
+
+    record, df = measure("assign_state_features", seasons, n_rows, "rows",
+                         lambda: mdl.assign_state_features(raw_df.copy()))
+    records.append(record)
+    record, _ = measure("assign_state_features_fast", seasons, n_rows, "rows",
+                        lambda: mdl.assign_state_features_fast(raw_df))
+    records.append(record)
+    del raw_df
+
+    record, count_matrices = measure("aggregate_count_matrices", seasons, len(df), "rows",
+                                     lambda: mdl.aggregate_count_matrices(df), repeat=3)
+    records.append(record)
+    record, _ = measure("build_model", seasons, 1, "models",
+                        lambda: mdl.build_model(count_matrices), repeat=3)
+    records.append(record)
+    return records
+
+def run_solver_benchmarks(model: dict, n_lineups: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    lineup_tensor = build_lineup_tensor(model, n_lineups, rng)
+    lineup_matrices = list(lineup_tensor[0])
+
+    records = []
+    n_single = min(n_lineups, 100) # 1打順ずつ解く場合は最大100打順だけ計測する
+    record, _ = measure("solve_run_expectancies", n_lineups, n_single, "lineups",
+                        lambda: [ana.solve_run_expectancies(list(lineup)) for lineup in lineup_tensor[:n_single]],
+                        repeat=3)
+    records.append(record)
+    record, _ = measure("solve_run_expectancies_batch", n_lineups, n_lineups, "lineups",
+                        lambda: ana.solve_run_expectancies_batch(lineup_tensor), repeat=3)
+    records.append(record)
+    record, _ = measure("solve_score_distribution", n_lineups, 1, "lineups",
+                        lambda: ana.solve_score_distribution(lineup_matrices), repeat=3)
+    records.append(record)
+    return records
+
+def run_simulation_benchmarks(model: dict, num_simulations: int, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    lineup_matrices = list(build_lineup_tensor(model, 1, rng)[0])
+
+    records = []
+    record, _ = measure("simulate_states", num_simulations, num_simulations, "trials",
+                        lambda: ana.simulate_states(lineup_matrices, num_simulations=num_simulations))
+    records.append(record)
+    for method in ["alias", "inverse"]:
+        record, _ = measure(f"simulate_states_fast[{method}]", num_simulations, num_simulations, "trials",
+                            lambda: ana.simulate_states_fast(lineup_matrices, num_simulations=num_simulations,
+                                                             rng=seed, method=method))
+        records.append(record)
+    return records
+
+def git_revision() -> str | None:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+def compare_results(records: list[dict], baseline_path: Path) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline_records = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+
+    print(f"\n=== Comparison with {baseline_path.name} (revision: {baseline['meta'].get('revision')}) ===")
+    for record in records:
+        base = baseline_records.get((record["stage"], record["scale"]))
+        if base is None:
+            continue
+        speedup = base["seconds"] / record["seconds"] if record["seconds"] > 0 else float("nan")
+        memory_ratio = record["peak_mib"] / base["peak_mib"] if base["peak_mib"] > 0 else float("nan")
+        print(f"{record['stage']:<28} scale={record['scale']:<6} speedup x{speedup:6.2f}  memory x{memory_ratio:6.2f}")
+
+# %%
+# 3. 実行
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run offline benchmarks on synthetic Statcast data.")
+    parser.add_argument("--seasons", type=float, nargs="+", default=[0.1, 1.0, 5.0],
+                        help="Sizes of the synthetic Statcast data in seasons (up to 20).")
+    parser.add_argument("--lineups", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--simulations", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="Previous benchmark JSON to compare with.")
+    args = parser.parse_args()
+
+    records = []
+    model = mdl.build_model(mdl.aggregate_count_matrices(
+        mdl.assign_state_features_fast(mdl.generate_synthetic_statcast(n_seasons=0.2, seed=args.seed))
+    ))
+    for seasons in args.seasons:
+        records += run_data_benchmarks(seasons, args.seed)
+    for n_lineups in args.lineups:
+        records += run_solver_benchmarks(model, n_lineups, args.seed)
+    for num_simulations in args.simulations:
+        records += run_simulation_benchmarks(model, num_simulations, args.seed)
+
+    output = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": records,
+    }
+    out_path = args.output or BENCHMARK_DIR / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nSaved benchmark results to {out_path}")
+
+    if args.compare is not None:
+        compare_results(records, args.compare)
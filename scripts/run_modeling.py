@@ -35,8 +35,24 @@ cmn.print_matrix_formatted(
 # 5. モデルの作成
 model = mdl.build_model(count_matrices)
 mdl.save_model(model, model_name="main")
+model_hash = cmn.save_model_artifact(model, seasons=list(range(start_year, end_year + 1)), name="main")
+print(f"Model artifact: {model_hash}")
 cmn.print_matrix_formatted(
     model["single"],
     title="State Transition Matrix (Single)",
     mode="rate"
 )
+
+# %%
+# 6. 作戦モデルの作成
+strategy_model = mdl.build_strategy_model(count_matrices)
+mdl.save_model(strategy_model, model_name="strategy")
+strategy_hash = cmn.save_model_artifact(
+    strategy_model, seasons=list(range(start_year, end_year + 1)), name="strategy", mapping=cmn.STRATEGY_MAPPING
+)
+print(f"Strategy model artifact: {strategy_hash}")
+cmn.print_matrix_formatted(
+    strategy_model["sac_bunt"],
+    title="State Transition Matrix (Sacrifice Bunt)",
+    mode="rate"
+)
@@ -0,0 +1,61 @@
+# %%
+# 1. セットアップ
+import argparse
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+import src.common as cmn
+import src.players as pl
+import src.analysis as ana
+
+SEASON_DIR = PROJECT_ROOT / "data" / "artifacts" / "season"
+
+# %%
+# 2. リーグ全体の選手行列の作成
+def build_team_matrices(
+    model: cmn.Model, model_key: str, stats_dir: Path, n_batters: int
+) -> dict[str, list[cmn.Matrix]]:
+    # 各チームの打席数上位 n_batters 人を、打席数の順に打順とする
+    team_matrices = {}
+    for team, stats_df in pl.load_league_stats(stats_dir).items():
+        lineup_df = pl.pick_regular_lineup(stats_df, n_batters)
+        team_matrices[team] = pl.build_lineup_matrices(model, pl.convert_stats_to_probs(lineup_df), model_key)
+        print(f"{team}: {', '.join(lineup_df['Name'])}")
+    print()
+    return team_matrices
+
+# %%
+# 3. 実行
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate full seasons for every team CSV in a directory.")
+    parser.add_argument("--stats-dir", type=Path, default=PROJECT_ROOT / "data" / "examples")
+    parser.add_argument("--model", default="main", help="Name or hash of the model artifact.")
+    parser.add_argument("--seasons", type=int, default=1000)
+    parser.add_argument("--games", type=int, default=162, help="Games per team.")
+    parser.add_argument("--batters", type=int, default=9)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=SEASON_DIR)
+    args = parser.parse_args()
+
+    model = cmn.load_model_artifact(args.model)
+    model_key = cmn.read_model_manifest(args.model)["hash"]
+    team_matrices = build_team_matrices(model, model_key, args.stats_dir, args.batters)
+    summary, seasons = ana.simulate_seasons(
+        team_matrices,
+        num_seasons=args.seasons,
+        games_per_team=args.games,
+        n_workers=args.workers,
+        seed=args.seed,
+    )
+
+    print("=== Projected Standings ===")
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(args.output / "standings_summary.csv", index=False)
+    seasons.to_parquet(args.output / "seasons.parquet", index=False)
+    print(f"\nSaved season results to {args.output}")
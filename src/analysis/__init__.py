@@ -1,7 +1,35 @@
-from .markov import solve_run_expectancies, print_run_expectancies
+from .markov import (
+    solve_run_expectancies,
+    solve_run_expectancies_batch,
+    solve_scoring_probabilities_batch,
+    solve_runs_per_game_batch,
+    solve_score_distribution,
+    print_run_expectancies,
+)
 from .monte_carlo import (
     simulate_states,
+    simulate_states_fast,
+    simulate_states_histogram,
     calculate_prob_at_least,
     calculate_score_distribution,
     print_simulation_report,
 )
+from .lineup_optimizer import optimize_batting_order
+from .substitution import search_substitutions
+from .game import simulate_games, calculate_win_probabilities
+from .win_expectancy import (
+    build_win_expectancy_tables,
+    save_win_expectancy_tables,
+    load_win_expectancy_tables,
+    lookup_win_expectancy,
+    lookup_leverage_index,
+)
+from .parallel import simulate_states_parallel
+from .strategy import build_strategy_table
+from .sensitivity import solve_run_expectancy_gradients
+from .bootstrap import bootstrap_run_expectancies
+from .scenarios import run_scenarios
+from .adaptive import simulate_states_adaptive, print_adaptive_report
+from .comparison import compare_scenarios, print_comparison_report
+from .trajectory import simulate_trajectories, write_trajectories
+from .season import generate_schedule, simulate_seasons
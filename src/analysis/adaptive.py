@@ -0,0 +1,172 @@
+import warnings
+from statistics import NormalDist
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .markov import _solve_cyclic
+from .monte_carlo import (
+    UniformSource,
+    _build_sampler,
+    _simulate_innings,
+    _validate_simulation_inputs,
+)
+
+def simulate_states_adaptive(
+    lineup_matrices: list[cmn.Matrix],
+    batter_index: int = 0,
+    state: str | int = 0,
+    prob_error: float = 0.005,
+    targets: tuple[int, ...] = (1, 2, 3),
+    confidence: float = 0.95,
+    chunk_size: int = 100000,
+    max_simulations: int = 10000000,
+    rng: np.random.Generator | int | None = None,
+) -> pd.DataFrame:
+    # P(得点 >= k) の信頼区間の半幅が prob_error 以下になるまで、chunk_size ずつ試行を追加する
+    # 対になる2試行には u と 1-u を使い(対称変量)、期待値が厳密に分かるイニングの打席数を制御変量とする
+    # (打席数は得点と強く相関する。naive_std_error は制御変量なしの値)
+    state = _validate_simulation_inputs(lineup_matrices, batter_index, state)
+    if prob_error <= 0:
+        raise ValueError("prob_error must be positive")
+    if any(k <= 0 for k in targets):
+        raise ValueError("targets must be positive")
+    if not (0 < confidence < 1):
+        raise ValueError("confidence must be between 0 and 1")
+    if chunk_size < 2 or chunk_size % 2 != 0:
+        raise ValueError("chunk_size must be a positive even number")
+    if max_simulations < chunk_size:
+        raise ValueError("max_simulations must be greater than or equal to chunk_size")
+    rng = np.random.default_rng(rng)
+
+    stacked_matrix = np.stack(lineup_matrices)
+    n_batters = stacked_matrix.shape[0]
+    sampler = _build_sampler(stacked_matrix, method="inverse") # 対称変量の効果が出るよう単調な逆関数法を使う
+
+    # 打席数の期待値は、一時的状態からの1遷移を報酬1として得点期待値と同じ巡回ソルバーで解く
+    q = stacked_matrix[:, :24, :24]
+    step_counts = stacked_matrix[:, :24, :].sum(axis=-1)
+    control_mean = _solve_cyclic(q, step_counts[..., None])[batter_index, state, 0]
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n_metrics = 2 + len(targets)
+    target_values = np.array(targets)
+    antithetic_uniforms = _antithetic_uniforms(rng)
+    batters = np.full(chunk_size, batter_index, dtype=np.int8)
+    states = np.full(chunk_size, state, dtype=np.int8)
+    plate_appearances = np.zeros(chunk_size, dtype=np.int64)
+
+    def uniforms(live: npt.NDArray[np.int64], step: int) -> npt.NDArray[np.float64]:
+        # 乱数を引くたびに、未完了の試行の打席数を数える
+        plate_appearances[live] += 1
+        return antithetic_uniforms(live, step)
+
+    # 対ごとの平均を1標本として、(打席数, 得点, 得点 >= k の指示関数) の十分統計量を累積する
+    n_pairs = 0
+    sums = np.zeros(n_metrics)
+    squares = np.zeros(n_metrics)
+    cross = np.zeros(n_metrics) # 打席数(制御変量)との積
+    while True:
+        plate_appearances[:] = 0
+        runs, _ = _simulate_innings(sampler, batters, states, n_batters, uniforms)
+        values = np.column_stack(
+            [plate_appearances, runs, runs[:, None] >= target_values]
+        ).astype(np.float64)
+        values = values.reshape(-1, 2, n_metrics).mean(axis=1)
+
+        n_pairs += values.shape[0]
+        sums += values.sum(axis=0)
+        squares += (values**2).sum(axis=0)
+        cross += (values * values[:, :1]).sum(axis=0)
+
+        estimates, std_errors, naive_std_errors = _control_variate_estimates(
+            n_pairs, sums, squares, cross, control_mean
+        )
+        if np.all(z * std_errors[2:] <= prob_error):
+            break
+        if 2 * n_pairs + chunk_size > max_simulations:
+            warnings.warn(
+                f"Target precision was not reached within {max_simulations:,} simulations "
+                f"(CI half-widths: {np.array2string(z * std_errors[2:], precision=4)})."
+            )
+            break
+
+    # 0番目(打席数)は制御変量なので結果に含めない
+    estimates, std_errors, naive_std_errors = estimates[1:], std_errors[1:], naive_std_errors[1:]
+
+    metrics = ["mean"] + [f"prob_at_least_{k}" for k in targets]
+    return pd.DataFrame({
+        "metric": metrics,
+        "estimate": estimates,
+        "std_error": std_errors,
+        "ci_lower": estimates - z * std_errors,
+        "ci_upper": estimates + z * std_errors,
+        "naive_std_error": naive_std_errors,
+        "num_simulations": 2 * n_pairs,
+    })
+
+def _antithetic_uniforms(rng: np.random.Generator) -> UniformSource:
+    # 試行 2i と 2i+1 には、各打席で u と 1-u を使う
+    # 未完了の試行番号は昇順なので、同じ対の試行は隣り合う
+    def uniforms(live: npt.NDArray[np.int64], step: int) -> npt.NDArray[np.float64]:
+        pairs = live // 2
+        is_new_pair = np.ones(live.size, dtype=bool)
+        is_new_pair[1:] = pairs[1:] != pairs[:-1]
+        pair_index = np.cumsum(is_new_pair) - 1
+        u = rng.random(int(pair_index[-1]) + 1)[pair_index]
+        return np.where(live % 2 == 1, 1.0 - u, u)
+    return uniforms
+
+def _control_variate_estimates(
+    n: int,
+    sums: npt.NDArray[np.float64],
+    squares: npt.NDArray[np.float64],
+    cross: npt.NDArray[np.float64],
+    control_mean: float,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # 戻り値は (推定値, 標準誤差, 制御変量を使わない場合の標準誤差)
+    # 0番目の値(打席数)を制御変量とする
+    means = sums / n
+    variances = squares / n - means**2
+    covariances = cross / n - means * means[0]
+    sample_control_mean = means[0]
+    control_variance = variances[0]
+
+    if control_variance > 0:
+        coefficients = covariances / control_variance
+        residual_variances = variances - coefficients * covariances
+    else:
+        coefficients = np.zeros_like(means)
+        residual_variances = variances
+    estimates = means - coefficients * (sample_control_mean - control_mean)
+    std_errors = np.sqrt(np.maximum(residual_variances, 0) / max(n - 1, 1))
+    naive_std_errors = np.sqrt(np.maximum(variances, 0) / max(n - 1, 1))
+    return estimates, std_errors, naive_std_errors
+
+def print_adaptive_report(
+    result: pd.DataFrame,
+    batter: str | int | None = None,
+    state: str | int | None = None,
+) -> None:
+    if len(result) == 0:
+        raise ValueError("result must not be empty")
+    if isinstance(state, str):
+        state = cmn.parse_state(state)
+
+    batter_str = str(batter + 1) if type(batter) is int else batter
+    state_str = cmn.STATE_STR_MAP.get(state)
+    print("=== Adaptive Simulation Report ===")
+    if batter is not None:
+        print(f" Batter: {batter_str}")
+    if state is not None:
+        print(f" State : {state_str}")
+    print(f" Trials: {int(result['num_simulations'].iloc[0]):,}")
+    print("-" * 34)
+    for row in result.itertuples():
+        if row.metric == "mean":
+            print(f" Mean      : {row.estimate:.4f} [{row.ci_lower:.4f}, {row.ci_upper:.4f}]")
+        else:
+            k = row.metric.removeprefix("prob_at_least_")
+            print(f" Score >= {k}: {row.estimate:6.2%} [{row.ci_lower:6.2%}, {row.ci_upper:6.2%}]")
+    print("==================================")
+    print()
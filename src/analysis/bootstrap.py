@@ -0,0 +1,59 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .markov import solve_run_expectancies_batch, solve_scoring_probabilities_batch
+
+def bootstrap_run_expectancies(
+    model_replicates: npt.NDArray[np.float64],
+    lineup_probs: pd.DataFrame,
+    confidence: float = 0.95,
+    batch_size: int = 256,
+) -> pd.DataFrame:
+    # model_replicates: (モデル数, len(RESULT_MAPPING), 25, 25)  (sample_model_replicates の出力)
+    # 打順 × 状態ごとに、得点期待値と得点確率の平均と信頼区間を返す
+    n_results = len(cmn.RESULT_MAPPING)
+    if model_replicates.ndim != 4 or model_replicates.shape[1:] != (n_results, 25, 25):
+        raise ValueError(f"model_replicates must be of shape (n_replicates, {n_results}, 25, 25)")
+    missing_results = set(cmn.RESULT_MAPPING) - set(lineup_probs.columns)
+    if missing_results:
+        raise ValueError(f"Lineup probabilities are missing results: {missing_results}")
+    if len(lineup_probs) == 0:
+        raise ValueError("lineup_probs must not be empty")
+    if not (0 < confidence < 1):
+        raise ValueError("confidence must be between 0 and 1")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    probs = lineup_probs[list(cmn.RESULT_MAPPING)].to_numpy(dtype=np.float64)
+    n_replicates = model_replicates.shape[0]
+    n = probs.shape[0]
+    run_expectancies = np.empty((n_replicates, n, 24), dtype=np.float64)
+    scoring_probs = np.empty((n_replicates, n, 24), dtype=np.float64)
+
+    # メモリを抑えるため、モデルをbatch_sizeずつまとめて解く
+    for start in range(0, n_replicates, batch_size):
+        stop = min(start + batch_size, n_replicates)
+        lineup_tensor = np.einsum("pr,brij->bpij", probs, model_replicates[start:stop])
+        lineup_tensor /= lineup_tensor.sum(axis=-1, keepdims=True)
+        run_expectancies[start:stop] = solve_run_expectancies_batch(lineup_tensor)
+        scoring_probs[start:stop] = solve_scoring_probabilities_batch(lineup_tensor)
+
+    quantiles = [(1 - confidence) / 2, (1 + confidence) / 2]
+    re_lower, re_upper = np.quantile(run_expectancies, quantiles, axis=0)
+    prob_lower, prob_upper = np.quantile(scoring_probs, quantiles, axis=0)
+
+    slot_grid, state_grid = np.meshgrid(np.arange(n), np.arange(24), indexing="ij")
+    result = pd.DataFrame({
+        "slot": slot_grid.ravel(),
+        "state": [cmn.STATE_STR_MAP[s] for s in state_grid.ravel()],
+        "run_expectancy": run_expectancies.mean(axis=0).ravel(),
+        "re_lower": re_lower.ravel(),
+        "re_upper": re_upper.ravel(),
+        "scoring_prob": scoring_probs.mean(axis=0).ravel(),
+        "prob_lower": prob_lower.ravel(),
+        "prob_upper": prob_upper.ravel(),
+    })
+    if "Name" in lineup_probs.columns:
+        result.insert(1, "batter", lineup_probs["Name"].to_numpy()[result["slot"]])
+    return result
@@ -0,0 +1,100 @@
+from statistics import NormalDist
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .monte_carlo import _build_sampler, _simulate_innings, _validate_simulation_inputs
+
+def compare_scenarios(
+    lineup_matrices: list[cmn.Matrix],
+    scenarios: list[tuple[int, str | int]],
+    num_simulations: int = 100000,
+    target_score: int = 1,
+    confidence: float = 0.95,
+    rng: np.random.Generator | int | None = None,
+) -> tuple[pd.DataFrame, npt.NDArray[np.int64]]:
+    # scenarios: (batter_index, state) のリスト。最初のシナリオを基準とする
+    # すべてのシナリオで、試行iのk打席目には同じ一様乱数を使う(共通乱数)
+    # 戻り値は (基準との差の要約, シナリオごとの得点 (シナリオ数, num_simulations))
+    if len(scenarios) < 2:
+        raise ValueError("scenarios must contain at least two scenarios")
+    if num_simulations <= 1:
+        raise ValueError("num_simulations must be greater than 1")
+    if target_score < 0:
+        raise ValueError("target_score must be non-negative")
+    if not (0 < confidence < 1):
+        raise ValueError("confidence must be between 0 and 1")
+    batters = np.array([batter_index for batter_index, _ in scenarios], dtype=np.int8)
+    states = np.array(
+        [_validate_simulation_inputs(lineup_matrices, b, s) for b, s in scenarios], dtype=np.int8
+    )
+    rng = np.random.default_rng(rng)
+
+    # 全シナリオを1回のカーネル呼び出しで計算する(試行番号 = シナリオ * num_simulations + i)
+    # 逆関数法は一様乱数に対して単調なので、同じ乱数から似た打席結果が得られる
+    n_scenarios = len(scenarios)
+    sampler = _build_sampler(np.stack(lineup_matrices), method="inverse")
+    uniforms = lambda live, step: rng.random(num_simulations)[live % num_simulations]
+    runs, _ = _simulate_innings(
+        sampler,
+        np.repeat(batters, num_simulations),
+        np.repeat(states, num_simulations),
+        len(lineup_matrices),
+        uniforms,
+    )
+    runs = runs.reshape(n_scenarios, num_simulations).astype(np.int64)
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    scored = (runs >= target_score).astype(np.float64)
+    run_diffs = runs - runs[0]
+    prob_diffs = scored - scored[0]
+    delta_runs = run_diffs.mean(axis=1)
+    delta_prob = prob_diffs.mean(axis=1)
+    runs_se = run_diffs.std(axis=1, ddof=1) / np.sqrt(num_simulations)
+    prob_se = prob_diffs.std(axis=1, ddof=1) / np.sqrt(num_simulations)
+
+    # 独立に2回シミュレーションした場合の標準誤差(比較用)
+    runs_var = runs.var(axis=1, ddof=1)
+    independent_se = np.sqrt((runs_var + runs_var[0]) / num_simulations)
+
+    summary = pd.DataFrame({
+        "batter_index": batters.astype(np.int64),
+        "state": [cmn.STATE_STR_MAP[s] for s in states],
+        "mean_runs": runs.mean(axis=1),
+        "prob": scored.mean(axis=1),
+        "delta_runs": delta_runs,
+        "delta_runs_se": runs_se,
+        "delta_runs_lower": delta_runs - z * runs_se,
+        "delta_runs_upper": delta_runs + z * runs_se,
+        "independent_se": independent_se,
+        "delta_prob": delta_prob,
+        "delta_prob_se": prob_se,
+        "delta_prob_lower": delta_prob - z * prob_se,
+        "delta_prob_upper": delta_prob + z * prob_se,
+    })
+    return summary, runs
+
+def print_comparison_report(
+    result: pd.DataFrame,
+    labels: list[str] | None = None,
+    confidence: float = 0.95,
+) -> None:
+    # compare_scenarios の要約を、基準(最初のシナリオ)との差として表示する
+    if len(result) < 2:
+        raise ValueError("result must contain at least two scenarios")
+    if labels is None:
+        labels = [f"{row.batter_index + 1} {row.state}" for row in result.itertuples()]
+    if len(labels) != len(result):
+        raise ValueError("labels must have the same length as result")
+
+    print("=== Paired Comparison Report ===")
+    print(f" Baseline: {labels[0]} (mean {result['mean_runs'].iloc[0]:.4f}, prob {result['prob'].iloc[0]:6.2%})")
+    print("-" * 32)
+    for label, row in zip(labels[1:], result.iloc[1:].itertuples()):
+        print(f" {label}: mean {row.mean_runs:.4f}, prob {row.prob:6.2%}")
+        print(f"   Δruns: {row.delta_runs:+.4f} [{row.delta_runs_lower:+.4f}, {row.delta_runs_upper:+.4f}]"
+              f" (SE {row.delta_runs_se:.4f}, independent {row.independent_se:.4f})")
+        print(f"   Δprob: {row.delta_prob:+6.2%} [{row.delta_prob_lower:+6.2%}, {row.delta_prob_upper:+6.2%}]")
+    print(f" ({confidence:.0%} confidence intervals)")
+    print("================================")
+    print()
@@ -0,0 +1,109 @@
+import numpy as np
+import numpy.typing as npt
+import src.common as cmn
+from .monte_carlo import Sampler, _build_sampler, _simulate_innings
+
+# タイブレーク(延長戦)の開始状態
+EXTRA_INNING_STATE = 2 # 0/_2_
+
+def simulate_games(
+    away_matrices: list[cmn.Matrix],
+    home_matrices: list[cmn.Matrix],
+    num_games: int = 100000,
+    innings: int = 9,
+    extra_innings: bool = True,
+    max_innings: int = 30,
+    rng: np.random.Generator | int | None = None,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # 戻り値は (ビジターの得点, ホームの得点)
+    n_batters = len(away_matrices)
+    if n_batters == 0:
+        raise ValueError("away_matrices must not be empty")
+    if len(home_matrices) != n_batters:
+        raise ValueError("away_matrices and home_matrices must have the same number of players")
+    if any(p.shape != (25, 25) for p in away_matrices + home_matrices):
+        raise ValueError("Each player matrix must be of shape (25, 25)")
+    if innings <= 0:
+        raise ValueError("innings must be positive")
+    if max_innings < innings:
+        raise ValueError("max_innings must be greater than or equal to innings")
+    rng = np.random.default_rng(rng)
+
+    # ビジターを打順0、ホームを打順1としてまとめたサンプラーを作る
+    sampler = _build_sampler(np.stack(away_matrices + home_matrices))
+    away_lineups = np.zeros(num_games, dtype=np.int64)
+    home_lineups = np.ones(num_games, dtype=np.int64)
+    away_scores, home_scores = _simulate_games(
+        sampler, n_batters, away_lineups, home_lineups,
+        innings, extra_innings, max_innings, rng,
+    )
+    return away_scores.astype(np.int64), home_scores.astype(np.int64)
+
+def calculate_win_probabilities(
+    away_scores: npt.NDArray[np.int64],
+    home_scores: npt.NDArray[np.int64],
+) -> tuple[float, float, float]:
+    # 戻り値は (ビジター勝利, ホーム勝利, 引き分け) の確率
+    if away_scores.size == 0:
+        raise ValueError("away_scores must not be empty")
+    if away_scores.shape != home_scores.shape:
+        raise ValueError("away_scores and home_scores must have the same shape")
+
+    away_win = float(np.mean(away_scores > home_scores))
+    home_win = float(np.mean(home_scores > away_scores))
+    tie = float(np.mean(away_scores == home_scores))
+    return away_win, home_win, tie
+
+def _simulate_games(
+    sampler: Sampler,
+    n_batters: int,
+    away_lineups: npt.NDArray[np.int64],
+    home_lineups: npt.NDArray[np.int64],
+    innings: int,
+    extra_innings: bool,
+    max_innings: int,
+    rng: np.random.Generator,
+) -> tuple[npt.NDArray[np.int16], npt.NDArray[np.int16]]:
+    num_games = away_lineups.shape[0]
+    away_scores = np.zeros(num_games, dtype=np.int16)
+    home_scores = np.zeros(num_games, dtype=np.int16)
+    away_leadoffs = np.zeros(num_games, dtype=np.int8)
+    home_leadoffs = np.zeros(num_games, dtype=np.int8)
+    uniforms = lambda live, step: rng.random(live.size)
+
+    live = np.arange(num_games)
+    last_inning = max_innings if extra_innings else innings
+    for inning in range(1, last_inning + 1):
+        start_state = 0 if inning <= innings else EXTRA_INNING_STATE
+        is_final_inning = inning >= innings
+
+        # 表の攻撃
+        states = np.full(live.size, start_state, dtype=np.int8)
+        runs, leadoffs = _simulate_innings(
+            sampler, away_leadoffs[live], states, n_batters, uniforms,
+            lineups=away_lineups[live],
+        )
+        away_scores[live] += runs
+        away_leadoffs[live] = leadoffs
+
+        # 裏の攻撃(最終回以降はホームがリードしていれば行わない)
+        batting = live
+        run_limits = None
+        if is_final_inning:
+            batting = live[home_scores[live] <= away_scores[live]]
+            run_limits = (away_scores[batting] - home_scores[batting]).astype(np.int64)
+        states = np.full(batting.size, start_state, dtype=np.int8)
+        runs, leadoffs = _simulate_innings(
+            sampler, home_leadoffs[batting], states, n_batters, uniforms,
+            lineups=home_lineups[batting], run_limits=run_limits,
+        )
+        home_scores[batting] += runs
+        home_leadoffs[batting] = leadoffs
+
+        # 最終回以降は同点の試合だけ続ける
+        if is_final_inning:
+            live = live[away_scores[live] == home_scores[live]]
+        if live.size == 0:
+            break
+
+    return away_scores, home_scores
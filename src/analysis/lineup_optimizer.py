@@ -0,0 +1,148 @@
+import hashlib
+import os
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+import numpy.typing as npt
+from tqdm import tqdm
+import src.common as cmn
+from .markov import solve_runs_per_game_batch, solve_run_expectancies_batch
+
+# ワーカープロセスごとに保持する選手行列と打順の一覧
+_worker_player_tensor: npt.NDArray[np.float64] | None = None
+_worker_orders: npt.NDArray[np.int8] | None = None
+_worker_innings: int = 9
+
+def optimize_batting_order(
+    player_matrices: list[cmn.Matrix],
+    top_k: int = 10,
+    innings: int = 9,
+    batch_size: int = 2048,
+    n_workers: int | None = None,
+    checkpoint_path: str | Path | None = None,
+    checkpoint_interval: float = 60.0,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # 戻り値は (打順 (k, n), 1試合の得点期待値 (k,), 得点期待値テーブル (k, n, 24))
+    # 打順は player_matrices のインデックスで表す
+    # checkpoint_path を指定すると、checkpoint_interval 秒ごとと最後に評価済みの得点を保存する
+    n_players = len(player_matrices)
+    if n_players == 0:
+        raise ValueError("player_matrices must not be empty")
+    if n_players > 10:
+        raise ValueError("player_matrices must contain at most 10 players")
+    if any(p.shape != (25, 25) for p in player_matrices):
+        raise ValueError("Each player matrix must be of shape (25, 25)")
+    if top_k <= 0:
+        raise ValueError("top_k must be positive")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    if checkpoint_interval < 0:
+        raise ValueError("checkpoint_interval must be non-negative")
+
+    player_tensor = np.stack(player_matrices)
+    orders = _enumerate_orders(n_players)
+    n_orders = orders.shape[0]
+    n_batches = -(-n_orders // batch_size)
+
+    # チェックポイントがあれば、評価済みのバッチを引き継ぐ
+    # 選手行列そのものではなく、選手行列とイニング数のハッシュで同じ問題かを確かめる
+    scores = np.full(n_orders, np.nan, dtype=np.float64)
+    players_hash = _hash_players(player_tensor, innings)
+    if checkpoint_path is not None:
+        checkpoint_path = Path(checkpoint_path)
+        if checkpoint_path.exists():
+            scores = _load_checkpoint(checkpoint_path, players_hash, n_orders)
+    pending = [
+        b for b in range(n_batches)
+        if np.isnan(scores[b * batch_size:(b + 1) * batch_size]).any()
+    ]
+
+    last_saved = time.monotonic()
+
+    def save_checkpoint_if_due() -> None:
+        nonlocal last_saved
+        if checkpoint_path is not None and time.monotonic() - last_saved >= checkpoint_interval:
+            _save_checkpoint(checkpoint_path, scores, players_hash)
+            last_saved = time.monotonic()
+
+    progress = tqdm(total=n_batches, initial=n_batches - len(pending), desc="Evaluating batting orders")
+    if n_workers == 1:
+        _init_worker(player_tensor, innings)
+        for b in pending:
+            start, end = b * batch_size, min((b + 1) * batch_size, n_orders)
+            scores[start:end] = _evaluate_batch(start, end)
+            save_checkpoint_if_due()
+            progress.update(1)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(player_tensor, innings),
+        ) as executor:
+            futures = {}
+            for b in pending:
+                start, end = b * batch_size, min((b + 1) * batch_size, n_orders)
+                futures[executor.submit(_evaluate_batch, start, end)] = (start, end)
+            for future in as_completed(futures):
+                start, end = futures[future]
+                scores[start:end] = future.result()
+                save_checkpoint_if_due()
+                progress.update(1)
+    progress.close()
+    if checkpoint_path is not None and pending:
+        _save_checkpoint(checkpoint_path, scores, players_hash)
+
+    # 上位k件を得点期待値の降順に並べる
+    top_k = min(top_k, n_orders)
+    top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+    top_indices = top_indices[np.argsort(-scores[top_indices], kind="stable")]
+    top_orders = orders[top_indices].astype(np.int64)
+    run_expectancies = solve_run_expectancies_batch(player_tensor[top_orders])
+    return top_orders, scores[top_indices], run_expectancies
+
+def _enumerate_orders(n_players: int) -> npt.NDArray[np.int8]:
+    # 辞書順に並べた全打順 (n!, n)
+    return np.array(list(itertools.permutations(range(n_players))), dtype=np.int8)
+
+def _init_worker(player_tensor: npt.NDArray[np.float64], innings: int) -> None:
+    global _worker_player_tensor, _worker_orders, _worker_innings
+    _worker_player_tensor = player_tensor
+    _worker_orders = _enumerate_orders(player_tensor.shape[0])
+    _worker_innings = innings
+
+def _evaluate_batch(start: int, end: int) -> npt.NDArray[np.float64]:
+    lineup_tensor = _worker_player_tensor[_worker_orders[start:end]]
+    return solve_runs_per_game_batch(lineup_tensor, innings=_worker_innings)
+
+def _hash_players(player_tensor: npt.NDArray[np.float64], innings: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(str(innings).encode())
+    digest.update(np.ascontiguousarray(player_tensor, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+def _load_checkpoint(
+    checkpoint_path: Path,
+    players_hash: str,
+    n_orders: int,
+) -> npt.NDArray[np.float64]:
+    with np.load(checkpoint_path) as checkpoint:
+        if (
+            "players_hash" not in checkpoint
+            or str(checkpoint["players_hash"]) != players_hash
+            or checkpoint["scores"].shape != (n_orders,)
+        ):
+            raise ValueError(f"Checkpoint does not match the given players: {checkpoint_path}")
+        return checkpoint["scores"].copy()
+
+def _save_checkpoint(
+    checkpoint_path: Path,
+    scores: npt.NDArray[np.float64],
+    players_hash: str,
+) -> None:
+    # 書き込み途中で中断しても壊れないように、一時ファイルから置き換える
+    os.makedirs(checkpoint_path.parent, exist_ok=True)
+    tmp_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp.npz")
+    np.savez(tmp_path, scores=scores, players_hash=players_hash)
+    os.replace(tmp_path, checkpoint_path)
@@ -1,51 +1,214 @@
+import warnings
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import src.common as cmn
 
-def solve_run_expectancies(lineup_matrices: list[cmn.Matrix]) -> list[cmn.Vector]:
+# 各状態のアウト数+走者数
+# 3アウト以外への遷移では (遷移前の値 + 1) - (遷移後の値) が得点になる
+_STATE_LOAD = np.array(
+    [s // 8 + cmn.BASE_BIT_MAP[s % 8].bit_count() for s in range(24)],
+    dtype=np.int64,
+)
+# 一時的状態間の遷移の得点(報酬ベクトルの計算用)
+_TRANSIENT_SCORES = cmn.STEP_SCORES[:24, :24].astype(np.float64)
+
+@cmn.profiled("solve_run_expectancies")
+def solve_run_expectancies(lineup_matrices: list[cmn.Matrix] | cmn.SparseTransition) -> list[cmn.Vector]:
+    if isinstance(lineup_matrices, cmn.SparseTransition):
+        # 24x24の連立方程式は密行列で解く(to_dense は (打者数, 25, 25) の配列を返す)
+        lineup_tensor = cmn.to_dense(lineup_matrices)
+    else:
+        if any(p.shape != (25, 25) for p in lineup_matrices):
+            raise ValueError("Each player matrix must be of shape (25, 25)")
+        lineup_tensor = np.stack(lineup_matrices) if lineup_matrices else np.empty((0, 25, 25))
+    if lineup_tensor.shape[0] == 0:
+        raise ValueError("lineup_matrices must not be empty")
+
+    # バッチ版を経由すると同じ計算が2回計測されるので、内部関数を直接呼ぶ
+    return list(_solve_run_expectancies(lineup_tensor))
+
+@cmn.profiled("solve_run_expectancies_batch")
+def solve_run_expectancies_batch(lineup_tensor: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    # lineup_tensor: (..., 打者数, 25, 25) -> 戻り値: (..., 打者数, 24)
+    if lineup_tensor.ndim < 3 or lineup_tensor.shape[-2:] != (25, 25):
+        raise ValueError("lineup_tensor must be of shape (..., n_batters, 25, 25)")
+    if lineup_tensor.shape[-3] == 0:
+        raise ValueError("lineup_tensor must contain at least one batter")
+    return _solve_run_expectancies(lineup_tensor)
+
+def _solve_run_expectancies(lineup_tensor: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    # 選手ごとに、一時的状態の遷移行列と報酬ベクトルを作成
+    q = lineup_tensor[..., :24, :24]
+    r = np.einsum("...ij,ij->...i", q, _TRANSIENT_SCORES)
+    return _solve_cyclic(q, r[..., None])[..., 0]
+
+def solve_scoring_probabilities_batch(lineup_tensor: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    # lineup_tensor: (..., 打者数, 25, 25) -> 戻り値: (..., 打者数, 24) イニング終了までに1点以上取る確率
+    if lineup_tensor.ndim < 3 or lineup_tensor.shape[-2:] != (25, 25):
+        raise ValueError("lineup_tensor must be of shape (..., n_batters, 25, 25)")
+    if lineup_tensor.shape[-3] == 0:
+        raise ValueError("lineup_tensor must contain at least one batter")
+
+    # 得点が入らない遷移だけを残すと、無得点でイニングを終える確率 Z は
+    #   Z_i = r_i + Q0_i Z_{i+1}  (r_i: 3アウトになる確率)
+    # となり、得点期待値と同じ巡回ソルバーで解ける
+    q_scoreless = lineup_tensor[..., :24, :24] * (cmn.STEP_SCORES[:24, :24] == 0)
+    r = lineup_tensor[..., :24, 24]
+    return 1.0 - _solve_cyclic(q_scoreless, r[..., None])[..., 0]
+
+def solve_runs_per_game_batch(
+    lineup_tensor: npt.NDArray[np.float64],
+    innings: int = 9,
+) -> npt.NDArray[np.float64]:
+    # lineup_tensor: (..., 打者数, 25, 25) -> 戻り値: (...,) 1番打者から始まる試合の得点期待値
+    if lineup_tensor.ndim < 3 or lineup_tensor.shape[-2:] != (25, 25):
+        raise ValueError("lineup_tensor must be of shape (..., n_batters, 25, 25)")
+    if innings <= 0:
+        raise ValueError("innings must be positive")
+
+    run_expectancies, leadoff_transitions = _solve_inning_transitions(lineup_tensor)
+    n = lineup_tensor.shape[-3]
+
+    # イニング先頭打者の分布を1イニングずつ進める
+    leadoff_probs = np.zeros(lineup_tensor.shape[:-3] + (n,), dtype=np.float64)
+    leadoff_probs[..., 0] = 1.0
+    expected_runs = np.zeros(lineup_tensor.shape[:-3], dtype=np.float64)
+    for _ in range(innings):
+        expected_runs += (leadoff_probs * run_expectancies[..., 0]).sum(axis=-1)
+        leadoff_probs = np.einsum("...i,...ij->...j", leadoff_probs, leadoff_transitions)
+    return expected_runs
+
+def _solve_inning_transitions(
+    lineup_tensor: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # 戻り値は (得点期待値 (..., n, 24), 先頭打者の遷移確率 (..., n, n))
+    # 得点と、各打者が3アウト目になる確率を1回の巡回ソルバーでまとめて解く
+    n = lineup_tensor.shape[-3]
+    q = lineup_tensor[..., :24, :24]
+    rewards = np.zeros(lineup_tensor.shape[:-3] + (n, 24, n + 1), dtype=np.float64)
+    rewards[..., 0] = np.einsum("...ij,ij->...i", q, _TRANSIENT_SCORES)
+    batters = np.arange(n)
+    rewards[..., batters, :, batters + 1] = lineup_tensor[..., batters, :24, 24]
+    solution = _solve_cyclic(q, rewards)
+
+    # 打者jが3アウト目になると、次のイニングは打者j+1から始まる
+    last_out_probs = solution[..., :, 0, 1:]
+    leadoff_transitions = np.roll(last_out_probs, 1, axis=-1)
+    return solution[..., 0], leadoff_transitions
+
+def _solve_cyclic(
+    q: npt.NDArray[np.float64],
+    r: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    # q: (..., n, 24, 24), r: (..., n, 24, k) -> 戻り値: (..., n, 24, k)
+    # 打者iの後には打者i+1が打つので、統合した遷移行列は巡回的なブロック構造になる
+    #   E_i = R_i + Q_i E_{i+1}  (添字はmod n)
+    # これを1周展開すると E_0 = c + P E_0 となる
+    #   P = Q_0 Q_1 ... Q_{n-1}
+    #   c = R_0 + Q_0 R_1 + ... + Q_0 ... Q_{n-2} R_{n-1}
+    # (I - P) E_0 = c を解いてから、E_{n-1}, E_{n-2}, ... の順に後退代入する
+    n = q.shape[-3]
+    product = q[..., n - 1, :, :]
+    accumulated = r[..., n - 1, :, :]
+    for i in range(n - 2, -1, -1):
+        product = q[..., i, :, :] @ product
+        accumulated = r[..., i, :, :] + q[..., i, :, :] @ accumulated
+
+    identity = np.eye(24)
+    with cmn.profile_stage("linear_solve") as extra:
+        try:
+            leadoff = np.linalg.solve(identity - product, accumulated)
+        except np.linalg.LinAlgError as e:
+            raise ValueError("Failed to solve for run expectancy due to singular matrix.") from e
+        if cmn.is_profiling_enabled():
+            extra["condition_number"] = float(np.linalg.cond(identity - product).max())
+
+    solution = np.empty_like(r, dtype=np.float64)
+    solution[..., 0, :, :] = leadoff
+    following = leadoff
+    for i in range(n - 1, 0, -1):
+        following = r[..., i, :, :] + q[..., i, :, :] @ following
+        solution[..., i, :, :] = following
+    return solution
+
+def _solve_fundamental_matrix(q: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    # 単位行列の各列を右辺として巡回ソルバーで解く
+    n = q.shape[0]
+    identity = np.zeros((n, 24, 24 * n), dtype=np.float64)
+    for i in range(n):
+        identity[i, :, 24 * i:24 * (i + 1)] = np.eye(24)
+    return _solve_cyclic(q, identity).reshape(24 * n, 24 * n)
+
+def solve_score_distribution(
+    lineup_matrices: list[cmn.Matrix],
+    batter_index: int = 0,
+    state: str | int = 0,
+    tol: float = 1e-12,
+    max_steps: int = 1000,
+) -> npt.NDArray[np.float64]:
     n = len(lineup_matrices)
     if n == 0:
         raise ValueError("lineup_matrices must not be empty")
     if any(p.shape != (25, 25) for p in lineup_matrices):
         raise ValueError("Each player matrix must be of shape (25, 25)")
+    state = cmn.parse_state(state)
+    if not (0 <= batter_index < n):
+        raise ValueError("batter_index must be between 0 and number of players - 1")
+    if not (0 <= state < 24):
+        raise ValueError("state must be between 0 and 23")
 
-    # 選手ごとに、一時的状態の遷移行列と報酬ベクトルを作成
-    q_list: list[cmn.Matrix] = []
-    r_list: list[cmn.Vector] = []
-    for player_matrix in lineup_matrices:
-        q_i = player_matrix[:24, :24]
-        r_i = (q_i * cmn.SCORE_MATRIX[:24, :24]).sum(axis=1)
-        q_list.append(q_i)
-        r_list.append(r_i)
-
-    # 選手を並べて、統合した一時的状態の遷移行列と報酬ベクトルを作成
-    q_all: cmn.Matrix = np.zeros((24 * n, 24 * n))
-    r_all: cmn.Vector = np.zeros(24 * n)
-    if n == 1:
-        q_all = q_list[0]
+    stacked_matrix = np.stack(lineup_matrices)
+    joint = _propagate_score_distributions(
+        stacked_matrix, np.array([batter_index]), np.array([state]), tol, max_steps
+    )
+    distribution = joint[0].sum(axis=1)
+
+    # 残り確率がtol未満になる末尾の得点は省略
+    tail_mass = np.cumsum(distribution[::-1])[::-1]
+    n_runs = max(int(np.count_nonzero(tail_mass >= tol)), 1)
+    return distribution[:n_runs]
+
+def _propagate_score_distributions(
+    stacked_matrix: npt.NDArray[np.float64],
+    batter_indices: npt.NDArray[np.int64],
+    states: npt.NDArray[np.int64],
+    tol: float,
+    max_steps: int,
+) -> npt.NDArray[np.float64]:
+    # 戻り値は (シナリオ, 得点, 次イニングの先頭打者) の同時確率
+    # 3アウト以外の遷移では得点が打席数と状態から決まるので、
+    # 得点の軸を持たずに (シナリオ, 状態) の確率ベクトルだけを伝播させる
+    n = stacked_matrix.shape[0]
+    n_scenarios = len(states)
+    q = stacked_matrix[:, :24, :24]
+    to_absorb = stacked_matrix[:, :24, 24]
+
+    probs = np.zeros((n_scenarios, 24), dtype=np.float64)
+    probs[np.arange(n_scenarios), states] = 1.0
+    offsets = _STATE_LOAD[states]
+    joint = np.zeros((n_scenarios, max_steps + _STATE_LOAD.max() + 1, n), dtype=np.float64)
+    rows = np.arange(n_scenarios)[:, None]
+
+    for step in range(max_steps):
+        batters = (batter_indices + step) % n
+
+        # 3アウトへの遷移は得点0として、それまでの得点で吸収
+        absorbed = probs * to_absorb[batters]
+        runs = np.maximum(step + offsets[:, None] - _STATE_LOAD[None, :], 0)
+        next_batters = ((batters + 1) % n)[:, None]
+        np.add.at(joint, (rows, runs, next_batters), absorbed)
+
+        probs = np.einsum("sa,sab->sb", probs, q[batters])
+        if probs.sum(axis=1).max() < tol:
+            break
     else:
-        for i in range(n):
-            next_batter = (i + 1) % n
-            row_start = 24 * i
-            row_end = 24 * (i + 1)
-            col_start = 24 * next_batter
-            col_end = 24 * (next_batter + 1)
-            q_all[row_start:row_end, col_start:col_end] = q_list[i]
-    for i in range(n):
-        r_all[24 * i:24 * (i + 1)] = r_list[i]
-
-    # 得点期待値の計算
-    # 吸収マルコフ連鎖の基本行列をを M = (I - Q)^(-1) とする
-    # 求める期待値ベクトルは E = M R
-    # つまり (I - Q) E = R を解く
-    try:
-        run_expectancy = np.linalg.solve(np.eye(24 * n) - q_all, r_all)
-    except np.linalg.LinAlgError as e:
-        raise ValueError("Failed to solve for run expectancy due to singular matrix.") from e
-
-    # 各選手ごとに分割して返す
-    run_expectancy_list: list[cmn.Vector] = np.split(run_expectancy, n)
-    return run_expectancy_list
+        warnings.warn(
+            f"Score distribution did not converge within {max_steps} steps "
+            f"(remaining mass: {probs.sum(axis=1).max():.3e})."
+        )
+
+    return joint
 
 def print_run_expectancies(
     run_expectancies: list[cmn.Vector],
@@ -1,7 +1,23 @@
+from typing import Callable, Literal
 import numpy as np
 import numpy.typing as npt
 import src.common as cmn
+from src.common import BASE_BIT_MAP
 
+# 打者自身も生還する遷移(本塁打)
+_BATTER_SCORES = cmn.STEP_SCORES == np.array(
+    [BASE_BIT_MAP[s % 8].bit_count() + 1 if s < 24 else -1 for s in range(25)]
+)[:, None]
+
+# 次の状態を決める関数: (打者, 状態, 一様乱数) -> 次の状態
+Sampler = Callable[
+    [npt.NDArray[np.integer], npt.NDArray[np.int8], npt.NDArray[np.float64]],
+    npt.NDArray[np.int8],
+]
+# 一様乱数を生成する関数: (未完了の試行番号, 打席番号) -> 一様乱数
+UniformSource = Callable[[npt.NDArray[np.int64], int], npt.NDArray[np.float64]]
+
+@cmn.profiled("simulate_states")
 def simulate_states(
     lineup_matrices: list[cmn.Matrix],
     batter_index: int = 0,
@@ -9,31 +25,22 @@ def simulate_states(
     num_simulations: int = 100000,
 ) -> npt.NDArray[np.int64]:
     n_batters = len(lineup_matrices)
-    if n_batters == 0:
-        raise ValueError("lineup_matrices must not be empty")
-    if any(p.shape != (25, 25) for p in lineup_matrices):
-        raise ValueError("Each player matrix must be of shape (25, 25)")
-    if isinstance(state, str):
-        state_str_map_inv = {v: k for k, v in cmn.STATE_STR_MAP.items()}
-        if state not in state_str_map_inv:
-            raise ValueError(f"Invalid initial_state string: {state}")
-        state = state_str_map_inv[state]
-    if not (0 <= batter_index < n_batters):
-        raise ValueError("initial_batter_index must be between 0 and number of players - 1")
-    if not (0 <= state < 24):
-        raise ValueError("initial_state must be between 0 and 23")
+    state = _validate_simulation_inputs(lineup_matrices, batter_index, state)
 
     stacked_matrix = np.stack(lineup_matrices) # 遷移行列のスタック(n_batters, 25, 25)
     current_batters = np.full(num_simulations, batter_index, dtype=np.int64)
     current_states = np.full(num_simulations, state, dtype=np.int64)
     total_runs = np.zeros(num_simulations, dtype=np.int64)
     active_mask = np.ones(num_simulations, dtype=bool)
+    live_counts = [] if cmn.is_profiling_enabled() else None
 
     while np.any(active_mask):
         # 未完了の試行の状態と打者を抽出
         active_states = current_states[active_mask]
         active_batters = current_batters[active_mask]
         n_active = active_states.shape[0]
+        if live_counts is not None:
+            live_counts.append(n_active)
 
         # 遷移確率に基づき次の状態を決定
         transition_probs = stacked_matrix[active_batters, active_states, :]
@@ -43,7 +50,7 @@ def simulate_states(
         next_states = np.minimum(next_states, 24) # 小数点誤差対策
 
         # 得点の更新
-        step_scores = cmn.SCORE_MATRIX[active_states, next_states]
+        step_scores = cmn.STEP_SCORES[active_states, next_states]
         total_runs[active_mask] += step_scores
 
         # 状態と打者の更新
@@ -54,62 +61,307 @@ def simulate_states(
         finished_mask = (next_states == 24)
         active_indices = np.where(active_mask)[0]
         active_mask[active_indices[finished_mask]] = False
-    
+
+    if live_counts is not None:
+        # 反復ごとの未完了試行数と、吸収(3アウト)までの打席数
+        cmn.record_metric(
+            "absorption",
+            num_simulations=num_simulations,
+            steps=len(live_counts),
+            mean_steps=sum(live_counts) / num_simulations,
+            live_counts=live_counts,
+        )
     return total_runs
 
-def calculate_prob_at_least(runs_array: npt.NDArray[np.int64], target_score: int) -> float:
-    if runs_array.size == 0:
-        raise ValueError("runs_array must not be empty")
+def simulate_states_fast(
+    lineup_matrices: list[cmn.Matrix] | cmn.SparseTransition,
+    batter_index: int = 0,
+    state: str | int = 0,
+    num_simulations: int = 100000,
+    rng: np.random.Generator | int | None = None,
+    method: Literal["alias", "inverse"] = "alias",
+) -> npt.NDArray[np.int64]:
+    state = _validate_simulation_inputs(lineup_matrices, batter_index, state)
+    rng = np.random.default_rng(rng)
+
+    if isinstance(lineup_matrices, cmn.SparseTransition):
+        n_batters = lineup_matrices.n_matrices
+        sampler = _build_sampler(lineup_matrices, method)
+    else:
+        n_batters = len(lineup_matrices)
+        sampler = _build_sampler(np.stack(lineup_matrices), method)
+    batters = np.full(num_simulations, batter_index, dtype=np.int8)
+    states = np.full(num_simulations, state, dtype=np.int8)
+    total_runs, _ = _simulate_innings(
+        sampler, batters, states, n_batters, lambda live, step: rng.random(live.size)
+    )
+    return total_runs.astype(np.int64)
+
+def simulate_states_histogram(
+    lineup_matrices: list[cmn.Matrix] | cmn.SparseTransition,
+    batter_index: int = 0,
+    state: str | int = 0,
+    num_simulations: int = 100000,
+    rng: np.random.Generator | int | None = None,
+    method: Literal["alias", "inverse"] = "alias",
+    chunk_size: int = 1000000,
+) -> cmn.RunHistogram:
+    # chunk_size 回ずつシミュレーションして得点のヒストグラムに足し込む
+    # 試行ごとの得点を保持しないので、メモリ使用量は試行回数によらない
+    state = _validate_simulation_inputs(lineup_matrices, batter_index, state)
+    if num_simulations <= 0:
+        raise ValueError("num_simulations must be positive")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    rng = np.random.default_rng(rng)
+
+    if isinstance(lineup_matrices, cmn.SparseTransition):
+        n_batters = lineup_matrices.n_matrices
+        sampler = _build_sampler(lineup_matrices, method)
+    else:
+        n_batters = len(lineup_matrices)
+        sampler = _build_sampler(np.stack(lineup_matrices), method)
+    return _simulate_histogram_chunks(sampler, n_batters, batter_index, state, num_simulations, rng, chunk_size)
+
+def _simulate_histogram_chunks(
+    sampler: Sampler,
+    n_batters: int,
+    batter_index: int,
+    state: int,
+    num_simulations: int,
+    rng: np.random.Generator,
+    chunk_size: int,
+) -> cmn.RunHistogram:
+    histogram = cmn.RunHistogram(np.zeros(1, dtype=np.int64))
+    for start in range(0, num_simulations, chunk_size):
+        size = min(chunk_size, num_simulations - start)
+        batters = np.full(size, batter_index, dtype=np.int8)
+        states = np.full(size, state, dtype=np.int8)
+        total_runs, _ = _simulate_innings(
+            sampler, batters, states, n_batters, lambda live, step: rng.random(live.size)
+        )
+        histogram = histogram.merge(cmn.RunHistogram.from_runs(total_runs))
+    return histogram
+
+def _validate_simulation_inputs(
+    lineup_matrices: list[cmn.Matrix] | cmn.SparseTransition,
+    batter_index: int,
+    state: str | int,
+) -> int:
+    if isinstance(lineup_matrices, cmn.SparseTransition):
+        if (lineup_matrices.indptr.size - 1) % 25 != 0:
+            raise ValueError("SparseTransition must have a multiple of 25 rows")
+        n_batters = lineup_matrices.n_matrices
+    else:
+        n_batters = len(lineup_matrices)
+        if any(p.shape != (25, 25) for p in lineup_matrices):
+            raise ValueError("Each player matrix must be of shape (25, 25)")
+    if n_batters == 0:
+        raise ValueError("lineup_matrices must not be empty")
+    state = cmn.parse_state(state)
+    if not (0 <= batter_index < n_batters):
+        raise ValueError("initial_batter_index must be between 0 and number of players - 1")
+    if not (0 <= state < 24):
+        raise ValueError("initial_state must be between 0 and 23")
+    return state
+
+def _simulate_innings(
+    sampler: Sampler,
+    batters: npt.NDArray[np.int8],
+    states: npt.NDArray[np.int8],
+    n_batters: int,
+    uniforms: UniformSource,
+    lineups: npt.NDArray[np.int64] | None = None,
+    run_limits: npt.NDArray[np.int64] | None = None,
+) -> tuple[npt.NDArray[np.int16], npt.NDArray[np.int8]]:
+    # 戻り値は (試行ごとの得点, 次イニングの先頭打者)
+    # lineups: 複数の打順をまとめたサンプラーを使う場合の、試行ごとの打順番号
+    # run_limits: 得点がこれを超えた時点で試行を打ち切る(サヨナラ)
+    #   本塁打以外のサヨナラでは、決勝点(run_limits + 1点目)までしか得点に数えない
+    n_trials = states.shape[0]
+    total_runs = np.zeros(n_trials, dtype=np.int16)
+    next_leadoffs = np.zeros(n_trials, dtype=np.int8)
+
+    # 未完了の試行だけを詰めて保持する
+    live = np.arange(n_trials, dtype=np.int64)
+    live_batters = batters.astype(np.int8)
+    live_states = states.astype(np.int8)
+    live_runs = np.zeros(n_trials, dtype=np.int16)
+    live_offsets = lineups * n_batters if lineups is not None else None
+    live_limits = run_limits
+
+    step = 0
+    while live.size > 0:
+        rows = live_batters if live_offsets is None else live_offsets + live_batters
+        next_states = sampler(rows, live_states, uniforms(live, step))
+        live_runs += cmn.STEP_SCORES[live_states, next_states]
+        live_batters = (live_batters + 1) % n_batters
+        step += 1
+
+        finished = next_states == 24
+        if live_limits is not None:
+            walk_off = live_runs > live_limits
+            capped = walk_off & ~_BATTER_SCORES[live_states, next_states]
+            live_runs[capped] = live_limits[capped] + 1
+            finished |= walk_off
+        if finished.any():
+            done = live[finished]
+            total_runs[done] = live_runs[finished]
+            next_leadoffs[done] = live_batters[finished]
+            keep = ~finished
+            live = live[keep]
+            live_batters = live_batters[keep]
+            live_runs = live_runs[keep]
+            next_states = next_states[keep]
+            if live_offsets is not None:
+                live_offsets = live_offsets[keep]
+            if live_limits is not None:
+                live_limits = live_limits[keep]
+        live_states = next_states
+
+    return total_runs, next_leadoffs
+
+def _build_sampler(
+    transitions: npt.NDArray[np.float64] | cmn.SparseTransition,
+    method: Literal["alias", "inverse"] = "alias",
+) -> Sampler:
+    # 各行の非ゼロ要素だけを幅Kの表に詰める
+    sparse = transitions if isinstance(transitions, cmn.SparseTransition) else cmn.to_sparse(transitions)
+    targets, probs = cmn.pack_sparse_rows(sparse)
+
+    if method == "alias":
+        accept, alias_targets = _build_alias_table(probs, targets)
+        return _make_alias_sampler(accept, targets, alias_targets)
+    if method == "inverse":
+        cumulative = np.cumsum(probs, axis=1)
+        cumulative[:, -1] = np.inf # 小数点誤差対策
+        return _make_inverse_sampler(cumulative, targets)
+    raise ValueError(f"Invalid method: {method} (must be 'alias' or 'inverse')")
+
+def _build_alias_table(
+    probs: npt.NDArray[np.float64],
+    targets: npt.NDArray[np.int8],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int8]]:
+    # Vose's alias method
+    n_rows, width = probs.shape
+    accept = np.ones((n_rows, width), dtype=np.float64)
+    alias_targets = targets.copy()
+    for i in range(n_rows):
+        scaled = probs[i] * width
+        small = [j for j in range(width) if scaled[j] < 1.0]
+        large = [j for j in range(width) if scaled[j] >= 1.0]
+        while small and large:
+            j_small = small.pop()
+            j_large = large[-1]
+            accept[i, j_small] = scaled[j_small]
+            alias_targets[i, j_small] = targets[i, j_large]
+            scaled[j_large] -= 1.0 - scaled[j_small]
+            if scaled[j_large] < 1.0:
+                small.append(large.pop())
+    return accept, alias_targets
+
+def _make_alias_sampler(
+    accept: npt.NDArray[np.float64],
+    targets: npt.NDArray[np.int8],
+    alias_targets: npt.NDArray[np.int8],
+) -> Sampler:
+    width = accept.shape[1]
+    accept_flat = accept.ravel()
+    targets_flat = targets.ravel()
+    alias_flat = alias_targets.ravel()
+
+    def sample(
+        batters: npt.NDArray[np.integer],
+        states: npt.NDArray[np.int8],
+        uniforms: npt.NDArray[np.float64],
+    ) -> npt.NDArray[np.int8]:
+        # 1つの一様乱数から列とその採択判定を取り出す
+        scaled = uniforms * width
+        columns = np.minimum(scaled.astype(np.int64), width - 1)
+        fractions = scaled - columns
+        index = (batters.astype(np.int64) * 25 + states) * width + columns
+        return np.where(fractions < accept_flat[index], targets_flat[index], alias_flat[index])
+
+    return sample
+
+def _make_inverse_sampler(
+    cumulative: npt.NDArray[np.float64],
+    targets: npt.NDArray[np.int8],
+) -> Sampler:
+    width = cumulative.shape[1]
+
+    def sample(
+        batters: npt.NDArray[np.integer],
+        states: npt.NDArray[np.int8],
+        uniforms: npt.NDArray[np.float64],
+    ) -> npt.NDArray[np.int8]:
+        rows = batters.astype(np.int64) * 25 + states
+        columns = (cumulative[rows] <= uniforms[:, None]).sum(axis=1)
+        return targets[rows, np.minimum(columns, width - 1)]
+
+    return sample
+
+def calculate_prob_at_least(
+    runs_array: npt.NDArray[np.int64] | cmn.RunHistogram,
+    target_score: int,
+) -> float:
     if target_score < 0:
         raise ValueError("target_score must be non-negative")
+    counts = _to_histogram(runs_array).counts
 
-    prob = np.mean(runs_array >= target_score)
+    prob = counts[target_score:].sum() / counts.sum()
     return prob
 
-def calculate_score_distribution(runs_array: npt.NDArray[np.int64]) -> npt.NDArray[np.float64]:
-    if runs_array.size == 0:
-        raise ValueError("runs_array must not be empty")
+def calculate_score_distribution(runs_array: npt.NDArray[np.int64] | cmn.RunHistogram) -> npt.NDArray[np.float64]:
+    counts = _to_histogram(runs_array).counts
 
-    unique, counts = np.unique(runs_array, return_counts=True)
-    total = runs_array.size
-    distribution = np.zeros(unique[-1] + 1, dtype=np.float64)
-    distribution[unique] = counts / total
+    # 末尾の0件の得点は含めない
+    max_runs = np.flatnonzero(counts)[-1]
+    distribution = counts[:max_runs + 1] / counts.sum()
     return distribution
 
+def _to_histogram(runs_array: npt.NDArray[np.int64] | cmn.RunHistogram) -> cmn.RunHistogram:
+    # 試行ごとの得点の配列も、得点のヒストグラムも受け付ける
+    if isinstance(runs_array, cmn.RunHistogram):
+        histogram = runs_array
+    else:
+        if runs_array.size == 0:
+            raise ValueError("runs_array must not be empty")
+        histogram = cmn.RunHistogram.from_runs(runs_array)
+    if histogram.num_trials == 0:
+        raise ValueError("runs_array must not be empty")
+    return histogram
+
 def print_simulation_report(
-    runs_array: npt.NDArray[np.int64],
+    runs_array: npt.NDArray[np.int64] | cmn.RunHistogram,
     batter: str | int | None = None,
     state: str | int | None = None,
 ) -> None:
-    if runs_array.size == 0:
-        raise ValueError("runs_array must not be empty")
+    histogram = _to_histogram(runs_array)
     if isinstance(state, str):
-        state_str_map_inv = {v: k for k, v in cmn.STATE_STR_MAP.items()}
-        if state not in state_str_map_inv:
-            raise ValueError(f"Invalid state string: {state}")
-        state = state_str_map_inv[state]
+        state = cmn.parse_state(state)
 
     batter_str = str(batter + 1) if type(batter) is int else batter
     state_str = cmn.STATE_STR_MAP.get(state)
-    mean = np.mean(runs_array)
-    std_dev = np.std(runs_array)
-    dist = calculate_score_distribution(runs_array)
+    mean = histogram.mean
+    std_dev = np.sqrt(histogram.variance)
+    dist = calculate_score_distribution(histogram)
 
     print("=== Simulation Report ===")
     if batter is not None:
         print(f" Batter: {batter_str}")
     if state is not None:
         print(f" State : {state_str}")
-    print(f" Trials: {len(runs_array):,}")
+    print(f" Trials: {histogram.num_trials:,}")
     print("-" * 25)
     print(f" Mean  : {mean:.3f}")
     print(f" StdDev: {std_dev:.3f}")
     print("-" * 25)
     print(" [Key Probabilities]")
-    print(f"  Score >= 1: {calculate_prob_at_least(runs_array, 1):.1%}")
-    print(f"  Score >= 2: {calculate_prob_at_least(runs_array, 2):.1%}")
-    print(f"  Score >= 3: {calculate_prob_at_least(runs_array, 3):.1%}")
-    print(f"  Score >= 4: {calculate_prob_at_least(runs_array, 4):.1%}")
+    print(f"  Score >= 1: {calculate_prob_at_least(histogram, 1):.1%}")
+    print(f"  Score >= 2: {calculate_prob_at_least(histogram, 2):.1%}")
+    print(f"  Score >= 3: {calculate_prob_at_least(histogram, 3):.1%}")
+    print(f"  Score >= 4: {calculate_prob_at_least(histogram, 4):.1%}")
     print("-" * 25)
     print(" [Distribution]")
     for score in range(len(dist)):
@@ -0,0 +1,120 @@
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Literal
+import numpy as np
+import numpy.typing as npt
+import src.common as cmn
+from .monte_carlo import Sampler, _build_sampler, _simulate_innings, _validate_simulation_inputs
+
+# ワーカープロセスごとに保持する共有メモリとサンプラー
+_worker_shared_memory: SharedMemory | None = None
+_worker_sampler: Sampler | None = None
+_worker_n_batters: int = 0
+
+# 1つの乱数ストリームを割り当てる試行回数
+SIMULATIONS_PER_STREAM = 10000
+
+def simulate_states_parallel(
+    lineup_matrices: list[cmn.Matrix],
+    batter_index: int = 0,
+    state: str | int = 0,
+    num_simulations: int = 100000,
+    seed: int | None = None,
+    n_workers: int | None = None,
+    method: Literal["alias", "inverse"] = "alias",
+    chunk_size: int = 1000000,
+) -> cmn.RunHistogram:
+    # 各ワーカーは chunk_size 回ずつシミュレーションしてヒストグラムに足し込む
+    # (chunk_size は SIMULATIONS_PER_STREAM の倍数に切り下げる。ただし最低1ブロック)
+    state = _validate_simulation_inputs(lineup_matrices, batter_index, state)
+    if num_simulations <= 0:
+        raise ValueError("num_simulations must be positive")
+    n_workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+    if n_workers <= 0:
+        raise ValueError("n_workers must be positive")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    # 試行を SIMULATIONS_PER_STREAM 回ずつのブロックに分け、ブロックごとに独立した乱数ストリームを割り当てる
+    # ブロックは chunk_size 回分ずつまとめてワーカーに渡すが、各ブロックの乱数は自分のストリームからだけ引くので、
+    # 結果はワーカー数・chunk_size・実行順によらず seed だけで決まる
+    stream_sizes = [
+        min(SIMULATIONS_PER_STREAM, num_simulations - s) for s in range(0, num_simulations, SIMULATIONS_PER_STREAM)
+    ]
+    stream_seeds = np.random.SeedSequence(seed).spawn(len(stream_sizes))
+    streams_per_task = max(chunk_size // SIMULATIONS_PER_STREAM, 1)
+    tasks = [
+        (stream_sizes[i:i + streams_per_task], stream_seeds[i:i + streams_per_task])
+        for i in range(0, len(stream_sizes), streams_per_task)
+    ]
+    stacked_matrix = np.stack(lineup_matrices)
+
+    if n_workers == 1:
+        sampler = _build_sampler(stacked_matrix, method)
+        histograms = [
+            _simulate_streams(sampler, stacked_matrix.shape[0], batter_index, state, sizes, seeds)
+            for sizes, seeds in tasks
+        ]
+        return functools.reduce(cmn.RunHistogram.merge, histograms)
+
+    # 選手行列は共有メモリ経由でワーカーに渡す
+    shared_memory = SharedMemory(create=True, size=stacked_matrix.nbytes)
+    try:
+        shared_tensor = np.ndarray(stacked_matrix.shape, dtype=stacked_matrix.dtype, buffer=shared_memory.buf)
+        shared_tensor[:] = stacked_matrix
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(shared_memory.name, stacked_matrix.shape, method),
+        ) as executor:
+            futures = [
+                executor.submit(_run_worker, batter_index, state, sizes, seeds)
+                for sizes, seeds in tasks
+            ]
+            histograms = [future.result() for future in futures]
+        del shared_tensor
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+    return functools.reduce(cmn.RunHistogram.merge, histograms)
+
+def _simulate_streams(
+    sampler: Sampler,
+    n_batters: int,
+    batter_index: int,
+    state: int,
+    stream_sizes: list[int],
+    stream_seeds: list[np.random.SeedSequence],
+) -> cmn.RunHistogram:
+    # 複数のブロックを1回のカーネル呼び出しでシミュレーションする
+    # 未完了の試行番号は昇順なので、ブロックの境界で分けてそれぞれのストリームから乱数を引く
+    rngs = [np.random.default_rng(s) for s in stream_seeds]
+    boundaries = np.cumsum(stream_sizes)[:-1]
+    num_simulations = int(sum(stream_sizes))
+
+    def uniforms(live: npt.NDArray[np.int64], step: int) -> npt.NDArray[np.float64]:
+        blocks = np.split(live, np.searchsorted(live, boundaries))
+        return np.concatenate([rng.random(block.size) for rng, block in zip(rngs, blocks)])
+
+    batters = np.full(num_simulations, batter_index, dtype=np.int8)
+    states = np.full(num_simulations, state, dtype=np.int8)
+    total_runs, _ = _simulate_innings(sampler, batters, states, n_batters, uniforms)
+    return cmn.RunHistogram.from_runs(total_runs)
+
+def _init_worker(shared_name: str, shape: tuple[int, ...], method: Literal["alias", "inverse"]) -> None:
+    global _worker_shared_memory, _worker_sampler, _worker_n_batters
+    _worker_shared_memory = SharedMemory(name=shared_name)
+    stacked_matrix = np.ndarray(shape, dtype=np.float64, buffer=_worker_shared_memory.buf)
+    _worker_sampler = _build_sampler(stacked_matrix, method)
+    _worker_n_batters = shape[0]
+
+def _run_worker(
+    batter_index: int,
+    state: int,
+    stream_sizes: list[int],
+    stream_seeds: list[np.random.SeedSequence],
+) -> cmn.RunHistogram:
+    return _simulate_streams(_worker_sampler, _worker_n_batters, batter_index, state, stream_sizes, stream_seeds)
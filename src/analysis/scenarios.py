@@ -0,0 +1,178 @@
+from pathlib import Path
+from typing import Hashable, Iterator, Literal
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .markov import solve_run_expectancies_batch, _propagate_score_distributions
+from .monte_carlo import _build_sampler, _simulate_innings
+
+SCENARIO_COLS = ["lineup", "batter_index", "state"]
+
+def run_scenarios(
+    lineups: dict[Hashable, list[cmn.Matrix]],
+    scenarios: pd.DataFrame,
+    method: Literal["exact", "monte_carlo"] = "exact",
+    num_simulations: int = 100000,
+    targets: tuple[int, ...] = (1, 2, 3),
+    rng: np.random.Generator | int | None = None,
+    output_path: str | Path | None = None,
+    chunk_size: int = 1000000,
+    tol: float = 1e-12,
+    max_steps: int = 1000,
+) -> pd.DataFrame | None:
+    # scenarios: lineup(lineupsのキー), batter_index, state の列を持つ表
+    # 打順ごとに行列の準備と検証を1回だけ行い、重複したシナリオは1回だけ計算する
+    # output_path を指定すると、結果をParquetに逐次書き出して None を返す
+    missing_cols = set(SCENARIO_COLS) - set(scenarios.columns)
+    if missing_cols:
+        raise ValueError(f"scenarios is missing columns: {missing_cols}")
+    if len(scenarios) == 0:
+        raise ValueError("scenarios must not be empty")
+    if method not in ("exact", "monte_carlo"):
+        raise ValueError(f"Invalid method: {method} (must be 'exact' or 'monte_carlo')")
+    if num_simulations <= 0:
+        raise ValueError("num_simulations must be positive")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if any(k <= 0 for k in targets):
+        raise ValueError("targets must be positive")
+
+    stacked_lineups = _stack_lineups(lineups, scenarios["lineup"].unique())
+    unique_scenarios = _parse_scenarios(scenarios, stacked_lineups)
+
+    if method == "exact":
+        chunks = _iter_exact(stacked_lineups, unique_scenarios, targets, tol, max_steps)
+    else:
+        chunks = _iter_monte_carlo(
+            stacked_lineups, unique_scenarios, num_simulations, targets, np.random.default_rng(rng), chunk_size
+        )
+
+    if output_path is not None:
+        import pyarrow as pa
+        cmn.write_table_stream(
+            (pa.Table.from_pandas(chunk, preserve_index=False) for chunk in chunks), output_path
+        )
+        return None
+
+    results = pd.concat(list(chunks), ignore_index=True)
+    keys = scenarios[SCENARIO_COLS].assign(state=_parse_states(scenarios["state"]))
+    keys["state"] = keys["state"].map(cmn.STATE_STR_MAP)
+    return keys.merge(results, on=SCENARIO_COLS, how="left")
+
+def _stack_lineups(
+    lineups: dict[Hashable, list[cmn.Matrix]],
+    used_keys: npt.NDArray,
+) -> dict[Hashable, npt.NDArray[np.float64]]:
+    stacked_lineups = {}
+    for key in used_keys:
+        if key not in lineups:
+            raise ValueError(f"Lineup not found: {key}")
+        lineup_matrices = lineups[key]
+        if len(lineup_matrices) == 0:
+            raise ValueError(f"Lineup {key} must not be empty")
+        if any(p.shape != (25, 25) for p in lineup_matrices):
+            raise ValueError(f"Each player matrix in lineup {key} must be of shape (25, 25)")
+        stacked_lineups[key] = np.stack(lineup_matrices)
+    return stacked_lineups
+
+def _parse_states(states: pd.Series) -> pd.Series:
+    # 状態は文字列でも整数でもよい(重複を除いてから変換する)
+    parsed = {s: cmn.parse_state(s) for s in states.unique()}
+    return states.map(parsed).astype(np.int64)
+
+def _parse_scenarios(
+    scenarios: pd.DataFrame,
+    stacked_lineups: dict[Hashable, npt.NDArray[np.float64]],
+) -> pd.DataFrame:
+    unique_scenarios = (
+        scenarios[SCENARIO_COLS]
+        .assign(state=_parse_states(scenarios["state"]))
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+    if not unique_scenarios["state"].between(0, 23).all():
+        raise ValueError("state must be between 0 and 23")
+    n_batters = unique_scenarios["lineup"].map({k: v.shape[0] for k, v in stacked_lineups.items()})
+    if not ((unique_scenarios["batter_index"] >= 0) & (unique_scenarios["batter_index"] < n_batters)).all():
+        raise ValueError("batter_index must be between 0 and number of players - 1")
+    return unique_scenarios
+
+def _iter_exact(
+    stacked_lineups: dict[Hashable, npt.NDArray[np.float64]],
+    unique_scenarios: pd.DataFrame,
+    targets: tuple[int, ...],
+    tol: float,
+    max_steps: int,
+) -> Iterator[pd.DataFrame]:
+    # 打順ごとに、得点期待値と得点分布をまとめて解く
+    for key, group in unique_scenarios.groupby("lineup", sort=False):
+        stacked_matrix = stacked_lineups[key]
+        batters = group["batter_index"].to_numpy(dtype=np.int64)
+        states = group["state"].to_numpy(dtype=np.int64)
+
+        run_expectancies = solve_run_expectancies_batch(stacked_matrix)
+        joint = _propagate_score_distributions(stacked_matrix, batters, states, tol, max_steps)
+        distributions = joint.sum(axis=2)
+        yield _format_results(
+            group, run_expectancies[batters, states], np.full(len(group), np.nan), distributions, targets
+        )
+
+def _iter_monte_carlo(
+    stacked_lineups: dict[Hashable, npt.NDArray[np.float64]],
+    unique_scenarios: pd.DataFrame,
+    num_simulations: int,
+    targets: tuple[int, ...],
+    rng: np.random.Generator,
+    chunk_size: int,
+) -> Iterator[pd.DataFrame]:
+    # 打者数が同じ打順をまとめたサンプラーで、複数のシナリオを1回のカーネル呼び出しで計算する
+    n_batters_by_lineup = pd.Series({k: v.shape[0] for k, v in stacked_lineups.items()})
+    scenarios_per_chunk = max(chunk_size // num_simulations, 1)
+    uniforms = lambda live, step: rng.random(live.size)
+
+    for n_batters, lineup_keys in n_batters_by_lineup.groupby(n_batters_by_lineup, sort=False):
+        keys = list(lineup_keys.index)
+        sampler = _build_sampler(np.concatenate([stacked_lineups[k] for k in keys]))
+        lineup_ids = {k: i for i, k in enumerate(keys)}
+        group = unique_scenarios[unique_scenarios["lineup"].isin(keys)]
+
+        for start in range(0, len(group), scenarios_per_chunk):
+            chunk = group.iloc[start:start + scenarios_per_chunk]
+            n_scenarios = len(chunk)
+            batters = np.repeat(chunk["batter_index"].to_numpy(), num_simulations).astype(np.int8)
+            states = np.repeat(chunk["state"].to_numpy(), num_simulations).astype(np.int8)
+            lineups = np.repeat(chunk["lineup"].map(lineup_ids).to_numpy(), num_simulations).astype(np.int64)
+            runs, _ = _simulate_innings(sampler, batters, states, int(n_batters), uniforms, lineups=lineups)
+
+            # シナリオごとの得点のヒストグラム
+            max_runs = int(runs.max()) + 1
+            scenario_ids = np.repeat(np.arange(n_scenarios), num_simulations)
+            counts = np.bincount(scenario_ids * max_runs + runs, minlength=n_scenarios * max_runs)
+            distributions = counts.reshape(n_scenarios, max_runs) / num_simulations
+
+            run_values = np.arange(max_runs)
+            means = distributions @ run_values
+            variances = distributions @ run_values**2 - means**2
+            std_errors = np.sqrt(np.maximum(variances, 0) / num_simulations)
+            yield _format_results(chunk, means, std_errors, distributions, targets)
+
+def _format_results(
+    scenarios: pd.DataFrame,
+    expected_runs: npt.NDArray[np.float64],
+    std_errors: npt.NDArray[np.float64],
+    distributions: npt.NDArray[np.float64],
+    targets: tuple[int, ...],
+) -> pd.DataFrame:
+    result = pd.DataFrame({
+        "lineup": scenarios["lineup"].to_numpy(),
+        "batter_index": scenarios["batter_index"].to_numpy(dtype=np.int64),
+        "state": scenarios["state"].map(cmn.STATE_STR_MAP).to_numpy(),
+        "expected_runs": expected_runs,
+        "std_error": std_errors,
+    })
+    # 得点がk以上になる確率
+    tail_probs = np.cumsum(distributions[:, ::-1], axis=1)[:, ::-1]
+    for k in targets:
+        result[f"prob_at_least_{k}"] = tail_probs[:, k] if k < tail_probs.shape[1] else 0.0
+    return result
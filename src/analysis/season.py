@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from tqdm import tqdm
+import src.common as cmn
+from .game import _simulate_games
+from .monte_carlo import Sampler, _build_sampler
+
+# ワーカープロセスごとに保持するサンプラーと日程
+_worker_sampler: Sampler | None = None
+_worker_n_batters: int = 0
+_worker_n_teams: int = 0
+_worker_schedule: tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]] | None = None
+_worker_game_options: tuple[int, bool, int] = (9, True, 30)
+
+def generate_schedule(n_teams: int, games_per_team: int = 162) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    # 総当たり(サークル方式)を繰り返して、各チームが games_per_team 試合ずつ戦う日程を作る
+    # 戻り値は (ビジターのチーム番号, ホームのチーム番号)
+    # ホームゲームの数がチーム間でほぼ等しくなるようにする
+    if n_teams < 2 or n_teams % 2 != 0:
+        raise ValueError("n_teams must be an even number greater than or equal to 2")
+    if games_per_team <= 0:
+        raise ValueError("games_per_team must be positive")
+
+    n_rounds = n_teams - 1
+    rotation = np.arange(n_teams - 1)
+    home_games = np.zeros(n_teams, dtype=np.int64)
+    away, home = [], []
+    for r in range(games_per_team):
+        # チーム n_teams-1 を固定し、残りのチームを1つずつ回す
+        order = np.append(np.roll(rotation, r % n_rounds), n_teams - 1)
+        for a, b in zip(order[:n_teams // 2], order[::-1][:n_teams // 2]):
+            # ホームゲームの少ない方をホームにする(同数なら節ごとに交互)
+            if home_games[a] < home_games[b] or (home_games[a] == home_games[b] and r % 2 == 1):
+                a, b = b, a
+            away.append(a)
+            home.append(b)
+            home_games[b] += 1
+    return np.array(away, dtype=np.int64), np.array(home, dtype=np.int64)
+
+def simulate_seasons(
+    team_matrices: dict[str, list[cmn.Matrix]],
+    num_seasons: int = 1000,
+    games_per_team: int = 162,
+    innings: int = 9,
+    extra_innings: bool = True,
+    max_innings: int = 30,
+    seasons_per_task: int = 100,
+    n_workers: int | None = None,
+    seed: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # リーグ全体のシーズンを num_seasons 回シミュレーションする
+    # 戻り値は (チームごとの勝利数・得失点・順位の分布の要約, シーズン × チームごとの成績)
+    # シーズンは seasons_per_task ずつワーカーに割り当て、タスクごとに独立した乱数ストリームを使う
+    # (結果はワーカー数や実行順によらず seed だけで決まる)
+    teams = list(team_matrices.keys())
+    n_teams = len(teams)
+    if n_teams < 2 or n_teams % 2 != 0:
+        raise ValueError("team_matrices must contain an even number of teams (at least 2)")
+    n_batters = len(team_matrices[teams[0]])
+    if n_batters == 0:
+        raise ValueError("Each team must have at least one player")
+    for team in teams:
+        if len(team_matrices[team]) != n_batters:
+            raise ValueError(f"Team {team} must have {n_batters} players")
+        if any(p.shape != (25, 25) for p in team_matrices[team]):
+            raise ValueError(f"Each player matrix of team {team} must be of shape (25, 25)")
+    if num_seasons <= 0:
+        raise ValueError("num_seasons must be positive")
+    if seasons_per_task <= 0:
+        raise ValueError("seasons_per_task must be positive")
+    if innings <= 0:
+        raise ValueError("innings must be positive")
+    if max_innings < innings:
+        raise ValueError("max_innings must be greater than or equal to innings")
+
+    # 全チームの選手行列を1つにまとめる(チームiの打順番号はi)
+    player_tensor = np.concatenate([np.stack(team_matrices[team]) for team in teams])
+    schedule = generate_schedule(n_teams, games_per_team)
+    init_args = (player_tensor, n_batters, n_teams, schedule, (innings, extra_innings, max_innings))
+
+    task_sizes = [min(seasons_per_task, num_seasons - s) for s in range(0, num_seasons, seasons_per_task)]
+    child_seeds = np.random.SeedSequence(seed).spawn(len(task_sizes))
+    task_starts = np.cumsum([0] + task_sizes[:-1])
+    totals = np.zeros((5, num_seasons, n_teams), dtype=np.int64) # 勝, 敗, 分, 得点, 失点
+
+    progress = tqdm(total=num_seasons, desc="Simulating seasons", unit="season")
+    if n_workers == 1:
+        _init_worker(*init_args)
+        for start, size, child_seed in zip(task_starts, task_sizes, child_seeds):
+            totals[:, start:start + size] = _run_task(size, child_seed)
+            progress.update(size)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=init_args) as executor:
+            futures = {
+                executor.submit(_run_task, size, child_seed): (start, size)
+                for start, size, child_seed in zip(task_starts, task_sizes, child_seeds)
+            }
+            for future in as_completed(futures):
+                start, size = futures[future]
+                totals[:, start:start + size] = future.result()
+                progress.update(size)
+    progress.close()
+
+    seasons = pd.DataFrame({
+        "season": np.repeat(np.arange(num_seasons), n_teams),
+        "team": np.tile(teams, num_seasons),
+        "wins": totals[0].ravel(),
+        "losses": totals[1].ravel(),
+        "ties": totals[2].ravel(),
+        "runs_scored": totals[3].ravel(),
+        "runs_allowed": totals[4].ravel(),
+    })
+    # 勝利数が同じチームは同順位とする
+    seasons["rank"] = seasons.groupby("season")["wins"].rank(method="min", ascending=False).astype(np.int64)
+    return _summarize_seasons(seasons), seasons
+
+def _summarize_seasons(seasons: pd.DataFrame) -> pd.DataFrame:
+    grouped = seasons.groupby("team", sort=False)
+    summary = pd.DataFrame({
+        "mean_wins": grouped["wins"].mean(),
+        "std_wins": grouped["wins"].std(ddof=0),
+        "wins_p05": grouped["wins"].quantile(0.05),
+        "wins_p50": grouped["wins"].quantile(0.5),
+        "wins_p95": grouped["wins"].quantile(0.95),
+        "mean_runs_scored": grouped["runs_scored"].mean(),
+        "std_runs_scored": grouped["runs_scored"].std(ddof=0),
+        "mean_runs_allowed": grouped["runs_allowed"].mean(),
+        "std_runs_allowed": grouped["runs_allowed"].std(ddof=0),
+        "mean_rank": grouped["rank"].mean(),
+        "prob_first": grouped["rank"].apply(lambda rank: (rank == 1).mean()),
+    })
+    return summary.sort_values("mean_wins", ascending=False).reset_index()
+
+def _init_worker(
+    player_tensor: npt.NDArray[np.float64],
+    n_batters: int,
+    n_teams: int,
+    schedule: tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]],
+    game_options: tuple[int, bool, int],
+) -> None:
+    global _worker_sampler, _worker_n_batters, _worker_n_teams, _worker_schedule, _worker_game_options
+    _worker_sampler = _build_sampler(player_tensor)
+    _worker_n_batters = n_batters
+    _worker_n_teams = n_teams
+    _worker_schedule = schedule
+    _worker_game_options = game_options
+
+def _run_task(num_seasons: int, seed: np.random.SeedSequence) -> npt.NDArray[np.int64]:
+    # num_seasons シーズン分の全試合をまとめてシミュレーションし、シーズン × チームごとに集計する
+    # 戻り値: (勝, 敗, 分, 得点, 失点) × シーズン × チーム
+    rng = np.random.default_rng(seed)
+    away_teams, home_teams = _worker_schedule
+    innings, extra_innings, max_innings = _worker_game_options
+    away_lineups = np.tile(away_teams, num_seasons)
+    home_lineups = np.tile(home_teams, num_seasons)
+    away_scores, home_scores = _simulate_games(
+        _worker_sampler, _worker_n_batters, away_lineups, home_lineups,
+        innings, extra_innings, max_innings, rng,
+    )
+
+    n_teams = _worker_n_teams
+    size = num_seasons * n_teams
+    season_offsets = np.repeat(np.arange(num_seasons) * n_teams, away_teams.size)
+    away_keys = season_offsets + away_lineups
+    home_keys = season_offsets + home_lineups
+    count = lambda keys, weights=None: np.bincount(keys, weights=weights, minlength=size).astype(np.int64)
+
+    away_win = away_scores > home_scores
+    home_win = home_scores > away_scores
+    tie = ~(away_win | home_win)
+    totals = np.stack([
+        count(away_keys[away_win]) + count(home_keys[home_win]),
+        count(away_keys[home_win]) + count(home_keys[away_win]),
+        count(away_keys[tie]) + count(home_keys[tie]),
+        count(away_keys, away_scores) + count(home_keys, home_scores),
+        count(away_keys, home_scores) + count(home_keys, away_scores),
+    ])
+    return totals.reshape(5, num_seasons, n_teams)
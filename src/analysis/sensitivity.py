@@ -0,0 +1,48 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .markov import solve_run_expectancies_batch, _solve_fundamental_matrix
+
+def solve_run_expectancy_gradients(
+    transition_model: cmn.Model,
+    lineup_probs: pd.DataFrame,
+) -> npt.NDArray[np.float64]:
+    # 打席結果の確率に対する得点期待値の勾配
+    # 戻り値: grad[j, r, i, s] = dE_i(s) / dp_{j,r}  (形状: (打者数, 打席結果数, 打者数, 24))
+    # 打席結果の順序は transition_model のキーの順で、選手行列は build_lineup_matrices と同じく正規化する
+    results = list(transition_model.keys())
+    missing_results = set(results) - set(lineup_probs.columns)
+    if missing_results:
+        raise ValueError(f"Lineup probabilities are missing results: {missing_results}")
+    n = len(lineup_probs)
+    if n == 0:
+        raise ValueError("lineup_probs must not be empty")
+
+    probs = lineup_probs[results].to_numpy(dtype=np.float64)
+    model_tensor = np.stack([transition_model[r] for r in results]).astype(np.float64)[:, :24, :]
+    unnormalized = np.einsum("pr,rij->pij", probs, model_tensor)
+    row_sums = unnormalized.sum(axis=-1) # (打者数, 24)
+    if (row_sums <= 0).any():
+        raise ValueError("Each player matrix must have positive row sums")
+    player_rows = unnormalized / row_sums[..., None]
+
+    lineup_tensor = np.zeros((n, 25, 25), dtype=np.float64)
+    lineup_tensor[:, :24, :] = player_rows
+    lineup_tensor[:, 24, 24] = 1.0
+    run_expectancies = solve_run_expectancies_batch(lineup_tensor)
+
+    # 正規化を含めた選手行列の微分 dP_j/dp_r = (M_r - P_j * rowsum(M_r)) / S_j
+    d_rows = (
+        model_tensor[None, :, :, :]
+        - player_rows[:, None, :, :] * model_tensor.sum(axis=-1)[None, :, :, None]
+    ) / row_sums[:, None, :, None]
+    d_q = d_rows[..., :24]
+    d_r = (d_q * cmn.STEP_SCORES[:24, :24]).sum(axis=-1)
+
+    # E = R + Q E より dE = (I - Q)^(-1) (dR + dQ E)
+    # 打者jの確率を変えるとブロック行jだけが変わるので、基本行列のブロック列jを掛ければよい
+    next_runs = np.roll(run_expectancies, -1, axis=0)
+    perturbations = d_r + np.einsum("jrxy,jy->jrx", d_q, next_runs)
+    fundamental = _solve_fundamental_matrix(lineup_tensor[:, :24, :24]).reshape(n, 24, n, 24)
+    return np.einsum("isjx,jrx->jris", fundamental, perturbations)
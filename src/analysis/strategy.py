@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import src.common as cmn
+from .markov import solve_run_expectancies_batch, solve_scoring_probabilities_batch
+
+def build_strategy_table(
+    lineup_matrices: list[cmn.Matrix],
+    strategy_model: cmn.Model,
+    lineup_names: list[str] | None = None,
+) -> pd.DataFrame:
+    # 打順 × 状態 × 作戦ごとに、作戦を選んだ場合と打たせた場合の得点期待値と得点確率を比べる
+    # 作戦のデータがない状態は表に含めない
+    n = len(lineup_matrices)
+    if n == 0:
+        raise ValueError("lineup_matrices must not be empty")
+    if len(strategy_model) == 0:
+        raise ValueError("strategy_model must not be empty")
+    if any(p.shape != (25, 25) for p in lineup_matrices + list(strategy_model.values())):
+        raise ValueError("Each player and strategy matrix must be of shape (25, 25)")
+    if lineup_names is not None and len(lineup_names) != n:
+        raise ValueError("lineup_names must have the same length as lineup_matrices")
+
+    lineup_tensor = np.stack(lineup_matrices)
+    strategies = list(strategy_model.keys())
+    strategy_tensor = np.stack([strategy_model[s] for s in strategies])[:, :24, :] # (作戦, 24, 25)
+
+    # 打たせた場合 (打者数, 24)
+    base_runs = solve_run_expectancies_batch(lineup_tensor)
+    base_probs = solve_scoring_probabilities_batch(lineup_tensor)
+
+    # 作戦の後は次の打者から始まる (3アウトなら得点期待値0, 無得点確率1)
+    next_runs = np.zeros((n, 25), dtype=np.float64)
+    next_runs[:, :24] = np.roll(base_runs, -1, axis=0)
+    next_scoreless = np.ones((n, 25), dtype=np.float64)
+    next_scoreless[:, :24] = 1.0 - np.roll(base_probs, -1, axis=0)
+
+    step_scores = cmn.STEP_SCORES[:24, :]
+    immediate_runs = (strategy_tensor * step_scores).sum(axis=-1)
+    strategy_runs = immediate_runs[:, None, :] + np.einsum("sxy,jy->sjx", strategy_tensor, next_runs)
+    strategy_probs = 1.0 - np.einsum("sxy,jy->sjx", strategy_tensor * (step_scores == 0), next_scoreless)
+
+    available = strategy_tensor.sum(axis=-1) > 0 # (作戦, 24)
+    strategy_idx, slot_idx, state_idx = np.nonzero(np.broadcast_to(available[:, None, :], strategy_runs.shape))
+    result = pd.DataFrame({
+        "strategy": np.array(strategies)[strategy_idx],
+        "slot": slot_idx,
+        "state": [cmn.STATE_STR_MAP[s] for s in state_idx],
+        "base_runs": base_runs[slot_idx, state_idx],
+        "strategy_runs": strategy_runs[strategy_idx, slot_idx, state_idx],
+        "base_prob": base_probs[slot_idx, state_idx],
+        "strategy_prob": strategy_probs[strategy_idx, slot_idx, state_idx],
+    })
+    result.insert(5, "delta_runs", result["strategy_runs"] - result["base_runs"])
+    result["delta_prob"] = result["strategy_prob"] - result["base_prob"]
+    if lineup_names is not None:
+        result.insert(2, "batter", [lineup_names[i] for i in result["slot"]])
+    return result
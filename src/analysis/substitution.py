@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import src.common as cmn
+from .markov import _solve_fundamental_matrix
+
+def search_substitutions(
+    lineup_matrices: list[cmn.Matrix],
+    bench_matrices: list[cmn.Matrix],
+    batter_index: int = 0,
+    state: str | int = 0,
+    lineup_names: list[str] | None = None,
+    bench_names: list[str] | None = None,
+) -> pd.DataFrame:
+    n = len(lineup_matrices)
+    n_bench = len(bench_matrices)
+    if n == 0:
+        raise ValueError("lineup_matrices must not be empty")
+    if n_bench == 0:
+        raise ValueError("bench_matrices must not be empty")
+    if any(p.shape != (25, 25) for p in lineup_matrices + bench_matrices):
+        raise ValueError("Each player matrix must be of shape (25, 25)")
+    state = cmn.parse_state(state)
+    if not (0 <= batter_index < n):
+        raise ValueError("batter_index must be between 0 and number of players - 1")
+    if not (0 <= state < 24):
+        raise ValueError("state must be between 0 and 23")
+    if lineup_names is not None and len(lineup_names) != n:
+        raise ValueError("lineup_names must have the same length as lineup_matrices")
+    if bench_names is not None and len(bench_names) != n_bench:
+        raise ValueError("bench_names must have the same length as bench_matrices")
+
+    lineup_q = np.stack(lineup_matrices)[:, :24, :24]
+    bench_q = np.stack(bench_matrices)[:, :24, :24]
+    lineup_r = (lineup_q * cmn.STEP_SCORES[:24, :24]).sum(axis=-1)
+    bench_r = (bench_q * cmn.STEP_SCORES[:24, :24]).sum(axis=-1)
+
+    # 基本行列 M = (I - Q)^(-1) を一度だけ求める
+    fundamental = _solve_fundamental_matrix(lineup_q)
+    base_expectancy = fundamental @ lineup_r.ravel()
+
+    # 打者jを入れ替えると、統合した遷移行列はブロック行jだけが変わる
+    #   I - Q' = (I - Q) - U ΔQ_j V   (U: ブロック行j, V: ブロック列j+1)
+    # Woodbury の公式により、24x24の連立方程式を解くだけで新しい期待値が求まる
+    slots = np.arange(n)
+    slot_cols = fundamental.reshape(24 * n, n, 24).transpose(1, 0, 2) # M[:, J]: (n, 24n, 24)
+    next_rows = slot_cols.reshape(n, n, 24, 24)[slots, (slots + 1) % n] # M[J+1, J]: (n, 24, 24)
+    delta_q = bench_q[None, :, :, :] - lineup_q[:, None, :, :] # (n, n_bench, 24, 24)
+    delta_r = bench_r[None, :, :] - lineup_r[:, None, :] # (n, n_bench, 24)
+
+    updated = base_expectancy + np.einsum("jak,jbk->jba", slot_cols, delta_r)
+    following = updated.reshape(n, n_bench, n, 24)[slots, :, (slots + 1) % n]
+    capacitance = np.eye(24) - delta_q @ next_rows[:, None, :, :]
+    correction = np.linalg.solve(capacitance, (delta_q @ following[..., None]))[..., 0]
+    updated += np.einsum("jak,jbk->jba", slot_cols, correction)
+
+    target = batter_index * 24 + state
+    base_runs = base_expectancy[target]
+    new_runs = updated[:, :, target]
+
+    slot_grid, bench_grid = np.meshgrid(slots, np.arange(n_bench), indexing="ij")
+    result = pd.DataFrame({
+        "slot": slot_grid.ravel(),
+        "bench": bench_grid.ravel(),
+        "base_runs": base_runs,
+        "new_runs": new_runs.ravel(),
+        "delta_runs": (new_runs - base_runs).ravel(),
+    })
+    if lineup_names is not None:
+        result.insert(1, "replaced", [lineup_names[i] for i in result["slot"]])
+    if bench_names is not None:
+        result.insert(result.columns.get_loc("bench") + 1, "bench_name", [bench_names[i] for i in result["bench"]])
+    return result.sort_values("delta_runs", ascending=False, kind="stable").reset_index(drop=True)
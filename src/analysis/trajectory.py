@@ -0,0 +1,156 @@
+from pathlib import Path
+from typing import Iterator, Literal
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import src.common as cmn
+from .monte_carlo import _build_sampler
+
+# 1打席分の記録
+TRAJECTORY_DTYPE = np.dtype([
+    ("batter", np.int8),
+    ("from_state", np.int8),
+    ("event", np.int8), # transition_model のキーの順の番号
+    ("to_state", np.int8),
+    ("runs", np.int8),
+])
+
+TrajectoryChunk = tuple[npt.NDArray[np.void], npt.NDArray[np.int64]]
+
+def simulate_trajectories(
+    transition_model: cmn.Model,
+    lineup_probs: pd.DataFrame,
+    batter_index: int = 0,
+    state: str | int = 0,
+    num_innings: int = 100000,
+    chunk_size: int = 100000,
+    rng: np.random.Generator | int | None = None,
+) -> Iterator[TrajectoryChunk]:
+    # イニングを chunk_size ずつシミュレーションし、(打席の記録, イニングごとの開始位置) を返す
+    # イニングiの打席は records[offsets[i]:offsets[i+1]]
+    # 打席結果は、選手行列を打席結果ごとの行列に分解して 打席結果 -> 次の状態 の順に決める
+    # (選手行列から直接次の状態を決める場合と同じ分布になる)
+    results = list(transition_model.keys())
+    missing_results = set(results) - set(lineup_probs.columns)
+    if missing_results:
+        raise ValueError(f"Lineup probabilities are missing results: {missing_results}")
+    n_batters = len(lineup_probs)
+    if n_batters == 0:
+        raise ValueError("lineup_probs must not be empty")
+    if len(results) > np.iinfo(np.int8).max:
+        raise ValueError("transition_model has too many results")
+    state = cmn.parse_state(state)
+    if not (0 <= batter_index < n_batters):
+        raise ValueError("batter_index must be between 0 and number of players - 1")
+    if not (0 <= state < 24):
+        raise ValueError("state must be between 0 and 23")
+    if num_innings <= 0:
+        raise ValueError("num_innings must be positive")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+
+    probs = lineup_probs[results].to_numpy(dtype=np.float64)
+    model_tensor = np.stack([transition_model[r] for r in results]).astype(np.float64)
+    event_cumulative, result_matrices = _decompose_lineup(probs, model_tensor)
+    return _iter_trajectories(
+        event_cumulative, result_matrices, batter_index, state, num_innings, chunk_size, np.random.default_rng(rng)
+    )
+
+def _decompose_lineup(
+    probs: npt.NDArray[np.float64],
+    model_tensor: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # 選手行列 P_j[s] ∝ Σ_r p_{j,r} M_r[s] を
+    # 打席結果の確率 p_{j,r} |M_r[s]| / Σ と、打席結果ごとの遷移確率 M_r[s] / |M_r[s]| に分ける
+    # 戻り値: (打席結果の累積確率 (打者数, 24, 打席結果数), 打席結果ごとの遷移行列 (打席結果数, 25, 25))
+    model_row_sums = model_tensor[:, :24, :].sum(axis=-1) # (打席結果数, 24)
+    event_weights = probs[:, None, :] * model_row_sums.T[None, :, :]
+    weight_sums = event_weights.sum(axis=-1, keepdims=True)
+    if (weight_sums <= 0).any():
+        raise ValueError("Each player matrix must have positive row sums")
+    event_cumulative = np.cumsum(event_weights / weight_sums, axis=-1)
+    event_cumulative[..., -1] = np.inf # 小数点誤差対策
+
+    # 起こりえない (打席結果, 状態) の行は選ばれないので、3アウトへの遷移で埋めておく
+    result_matrices = np.zeros_like(model_tensor)
+    possible = model_row_sums > 0
+    result_matrices[:, :24, :][possible] = model_tensor[:, :24, :][possible] / model_row_sums[possible][:, None]
+    result_matrices[:, :24, 24][~possible] = 1.0
+    result_matrices[:, 24, 24] = 1.0
+    return event_cumulative, result_matrices
+
+def _iter_trajectories(
+    event_cumulative: npt.NDArray[np.float64],
+    result_matrices: npt.NDArray[np.float64],
+    batter_index: int,
+    state: int,
+    num_innings: int,
+    chunk_size: int,
+    rng: np.random.Generator,
+) -> Iterator[TrajectoryChunk]:
+    n_batters = event_cumulative.shape[0]
+    sampler = _build_sampler(result_matrices) # 打席結果を行列番号として次の状態を決める
+
+    for start in range(0, num_innings, chunk_size):
+        n_innings = min(chunk_size, num_innings - start)
+        live = np.arange(n_innings, dtype=np.int64)
+        live_batters = np.full(n_innings, batter_index, dtype=np.int8)
+        live_states = np.full(n_innings, state, dtype=np.int8)
+
+        # 打席ごとの記録を打席番号順に集め、最後にイニング順に並べ替える
+        innings, steps = [], []
+        while live.size > 0:
+            u = rng.random((2, live.size))
+            events = (event_cumulative[live_batters, live_states] <= u[0][:, None]).sum(axis=1).astype(np.int8)
+            next_states = sampler(events, live_states, u[1])
+
+            step = np.empty(live.size, dtype=TRAJECTORY_DTYPE)
+            step["batter"] = live_batters
+            step["from_state"] = live_states
+            step["event"] = events
+            step["to_state"] = next_states
+            step["runs"] = cmn.STEP_SCORES[live_states, next_states]
+            innings.append(live)
+            steps.append(step)
+
+            keep = next_states != 24
+            live = live[keep]
+            live_batters = ((live_batters[keep] + 1) % n_batters).astype(np.int8)
+            live_states = next_states[keep]
+
+        inning_ids = np.concatenate(innings)
+        order = np.argsort(inning_ids, kind="stable")
+        records = np.concatenate(steps)[order]
+        offsets = np.zeros(n_innings + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inning_ids, minlength=n_innings), out=offsets[1:])
+        yield records, offsets
+
+def write_trajectories(
+    chunks: Iterator[TrajectoryChunk],
+    output_path: str | Path,
+    event_labels: list[str],
+    file_format: Literal["parquet", "arrow"] = "parquet",
+) -> int:
+    # simulate_trajectories の結果を1打席1行の表として逐次書き出し、書き出したイニング数を返す
+    # inning 列は通し番号、event 列は event_labels を辞書とするカテゴリ列
+    import pyarrow as pa
+    n_innings = 0
+    labels = pa.array(event_labels, type=pa.string())
+
+    def tables() -> Iterator[pa.Table]:
+        nonlocal n_innings
+        for records, offsets in chunks:
+            n_chunk = offsets.size - 1
+            inning_ids = np.repeat(np.arange(n_innings, n_innings + n_chunk, dtype=np.int64), np.diff(offsets))
+            n_innings += n_chunk
+            yield pa.table({
+                "inning": inning_ids,
+                "batter": records["batter"],
+                "from_state": records["from_state"],
+                "event": pa.DictionaryArray.from_arrays(records["event"], labels),
+                "to_state": records["to_state"],
+                "runs": records["runs"],
+            })
+
+    cmn.write_table_stream(tables(), output_path, file_format)
+    return n_innings
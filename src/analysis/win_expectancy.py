@@ -0,0 +1,322 @@
+import os
+from pathlib import Path
+from typing import Literal
+import numpy as np
+import numpy.typing as npt
+import src.common as cmn
+from .markov import _propagate_score_distributions
+from .game import EXTRA_INNING_STATE
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+ARTIFACTS_DIR = PROJECT_ROOT / "data" / "artifacts"
+
+# テーブルの軸: (イニング, 表裏, 得点差, 状態, 攻撃側の打者, 守備側の次の先頭打者)
+# 勝率はホームチームから見た値で、得点差は (ホーム - ビジター)
+# 延長戦はすべて同じ状況とみなし、最後のイニングにまとめる
+WinExpectancyTables = dict[str, npt.NDArray]
+
+HALF_INDEX = {"top": 0, "bot": 1}
+
+def build_win_expectancy_tables(
+    away_matrices: list[cmn.Matrix],
+    home_matrices: list[cmn.Matrix],
+    innings: int = 9,
+    extra_innings: bool = True,
+    max_diff: int = 20,
+    tol: float = 1e-10,
+    max_steps: int = 1000,
+) -> WinExpectancyTables:
+    n = len(away_matrices)
+    if n == 0:
+        raise ValueError("away_matrices must not be empty")
+    if len(home_matrices) != n:
+        raise ValueError("away_matrices and home_matrices must have the same number of players")
+    if any(p.shape != (25, 25) for p in away_matrices + home_matrices):
+        raise ValueError("Each player matrix must be of shape (25, 25)")
+    if innings <= 0:
+        raise ValueError("innings must be positive")
+    if max_diff <= 0:
+        raise ValueError("max_diff must be positive")
+
+    away_tensor = np.stack(away_matrices)
+    home_tensor = np.stack(home_matrices)
+    n_runs = 2 * max_diff + 1
+    inning_dists = (
+        _inning_distributions(away_tensor, n_runs, tol, max_steps),
+        _inning_distributions(home_tensor, n_runs, tol, max_steps),
+    )
+
+    n_innings = innings + 1 if extra_innings else innings
+    win_expectancy = np.zeros((n_innings, 2, n_runs, 24, n, n), dtype=np.float64)
+    after_half = np.zeros((n_innings, 2, n_runs, n, n), dtype=np.float64)
+    diffs = np.arange(-max_diff, max_diff + 1)
+
+    def solve_half(i: int, half: int) -> None:
+        win_expectancy[i, half] = _expect_over_half(inning_dists[half], after_half[i, half], half)
+
+    def start_value(i: int, half: int) -> npt.NDArray[np.float64]:
+        # 攻撃開始時の勝率 (得点差, 攻撃側の先頭打者, 守備側の先頭打者)
+        start_state = 0 if i < innings else EXTRA_INNING_STATE
+        return win_expectancy[i, half, :, start_state]
+
+    def set_after_top(i: int) -> None:
+        # 表の攻撃終了後は裏の攻撃開始(攻守を入れ替える)
+        after_half[i, 0] = start_value(i, 1).transpose(0, 2, 1)
+        if i >= innings - 1:
+            after_half[i, 0, diffs > 0] = 1.0 # 最終回以降はホームがリードしていれば試合終了
+
+    def set_after_bot(i: int, extra_value: npt.NDArray[np.float64] | None) -> None:
+        if i < innings - 1:
+            after_half[i, 1] = start_value(i + 1, 0).transpose(0, 2, 1)
+            return
+        after_half[i, 1, diffs > 0] = 1.0
+        after_half[i, 1, diffs < 0] = 0.0
+        after_half[i, 1, diffs == 0] = 0.5 if extra_value is None else extra_value
+
+    # 延長戦は不動点になるまで反復する
+    extra_value = None
+    if extra_innings:
+        extra = innings
+        extra_value = np.full((n, n), 0.5)
+        for _ in range(max_steps):
+            set_after_bot(extra, extra_value)
+            solve_half(extra, 1)
+            set_after_top(extra)
+            solve_half(extra, 0)
+            next_value = start_value(extra, 0)[max_diff].T.copy() # (ホームの先頭打者, ビジターの先頭打者)
+            converged = np.abs(next_value - extra_value).max() < tol
+            extra_value = next_value
+            if converged:
+                break
+
+    # 正規のイニングを最終回から逆順に解く
+    for i in range(innings - 1, -1, -1):
+        set_after_bot(i, extra_value)
+        solve_half(i, 1)
+        set_after_top(i)
+        solve_half(i, 0)
+
+    swing = _calculate_swing(away_tensor, home_tensor, win_expectancy, after_half)
+    occupancy = _calculate_occupancy(away_tensor, home_tensor, innings, extra_innings, max_diff, tol, max_steps)
+    mean_swing = (swing * occupancy).sum() / occupancy.sum()
+    leverage_index = swing / mean_swing
+
+    return {
+        "win_expectancy": win_expectancy.astype(np.float32),
+        "leverage_index": leverage_index.astype(np.float32),
+        "innings": np.array(innings),
+        "max_diff": np.array(max_diff),
+    }
+
+def save_win_expectancy_tables(tables: WinExpectancyTables, name: str) -> None:
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    out_path = ARTIFACTS_DIR / f"{name}_win_expectancy.npz"
+    np.savez_compressed(out_path, **tables)
+
+def load_win_expectancy_tables(name: str) -> WinExpectancyTables:
+    file_path = ARTIFACTS_DIR / f"{name}_win_expectancy.npz"
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Win expectancy tables not found: {file_path}")
+    with np.load(file_path) as data:
+        return {key: data[key] for key in data.files}
+
+def lookup_win_expectancy(
+    tables: WinExpectancyTables,
+    inning: int,
+    half: Literal["top", "bot"],
+    score_diff: int,
+    state: str | int,
+    batter_index: int,
+    fielding_leadoff: int = 0,
+) -> float:
+    index = _table_index(tables, inning, half, score_diff, state, batter_index, fielding_leadoff)
+    return float(tables["win_expectancy"][index])
+
+def lookup_leverage_index(
+    tables: WinExpectancyTables,
+    inning: int,
+    half: Literal["top", "bot"],
+    score_diff: int,
+    state: str | int,
+    batter_index: int,
+    fielding_leadoff: int = 0,
+) -> float:
+    index = _table_index(tables, inning, half, score_diff, state, batter_index, fielding_leadoff)
+    return float(tables["leverage_index"][index])
+
+def _table_index(
+    tables: WinExpectancyTables,
+    inning: int,
+    half: Literal["top", "bot"],
+    score_diff: int,
+    state: str | int,
+    batter_index: int,
+    fielding_leadoff: int,
+) -> tuple[int, ...]:
+    n_innings = tables["win_expectancy"].shape[0]
+    n_batters = tables["win_expectancy"].shape[4]
+    max_diff = int(tables["max_diff"])
+    state = cmn.parse_state(state)
+    if inning < 1:
+        raise ValueError("inning must be positive")
+    if half not in HALF_INDEX:
+        raise ValueError(f"Invalid half: {half} (must be 'top' or 'bot')")
+    if not (0 <= state < 24):
+        raise ValueError("state must be between 0 and 23")
+    if not (0 <= batter_index < n_batters):
+        raise ValueError("batter_index must be between 0 and number of players - 1")
+    if not (0 <= fielding_leadoff < n_batters):
+        raise ValueError("fielding_leadoff must be between 0 and number of players - 1")
+
+    inning_index = min(inning, n_innings) - 1
+    diff_index = int(np.clip(score_diff, -max_diff, max_diff)) + max_diff
+    return (inning_index, HALF_INDEX[half], diff_index, state, batter_index, fielding_leadoff)
+
+def _inning_distributions(
+    lineup_tensor: npt.NDArray[np.float64],
+    n_runs: int,
+    tol: float,
+    max_steps: int,
+) -> npt.NDArray[np.float64]:
+    # (打者, 状態, 残りの得点, 次イニングの先頭打者) の同時確率
+    n = lineup_tensor.shape[0]
+    batters, states = np.meshgrid(np.arange(n), np.arange(24), indexing="ij")
+    joint = _propagate_score_distributions(lineup_tensor, batters.ravel(), states.ravel(), tol, max_steps)
+    joint[:, n_runs - 1] += joint[:, n_runs:].sum(axis=1) # 上限を超える得点は最後にまとめる
+    return joint[:, :n_runs].reshape(n, 24, n_runs, n)
+
+def _shift_diffs(values: npt.NDArray[np.float64], n_shifts: int, sign: int) -> npt.NDArray[np.float64]:
+    # 戻り値[r, d] = values[d + sign * r] (範囲外は端に丸める)
+    n_diffs = values.shape[0]
+    runs = np.arange(n_shifts)[:, None]
+    index = np.clip(np.arange(n_diffs)[None, :] + sign * runs, 0, n_diffs - 1)
+    return values[index]
+
+def _expect_over_half(
+    inning_dist: npt.NDArray[np.float64],
+    after_half: npt.NDArray[np.float64],
+    half: int,
+) -> npt.NDArray[np.float64]:
+    # 表はビジターの得点で得点差が減り、裏はホームの得点で増える
+    sign = -1 if half == 0 else 1
+    shifted = _shift_diffs(after_half, inning_dist.shape[2], sign) # (r, d, 次の先頭打者, 守備側)
+    return np.einsum("bsrx,rdxo->dsbo", inning_dist, shifted)
+
+def _calculate_swing(
+    away_tensor: npt.NDArray[np.float64],
+    home_tensor: npt.NDArray[np.float64],
+    win_expectancy: npt.NDArray[np.float64],
+    after_half: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    # 1打席での勝率変化の絶対値の期待値
+    n_innings, _, n_diffs, _, n, _ = win_expectancy.shape
+    scores = cmn.STEP_SCORES[:24, :24]
+    diffs = np.arange(n_diffs)[:, None, None]
+    next_batters = (np.arange(n) + 1) % n
+    swing = np.zeros_like(win_expectancy)
+
+    for half, lineup_tensor in enumerate((away_tensor, home_tensor)):
+        sign = -1 if half == 0 else 1
+        next_diffs = np.clip(diffs + sign * scores[None, :, :], 0, n_diffs - 1) # (d, s, t)
+        for i in range(n_innings):
+            current = win_expectancy[i, half] # (d, s, b, o)
+            following = current[
+                next_diffs[:, :, :, None, None],
+                np.arange(24)[None, None, :, None, None],
+                next_batters[None, None, None, :, None],
+                np.arange(n)[None, None, None, None, :],
+            ] # (d, s, t, b, o)
+            ended = after_half[i, half][:, next_batters, :] # (d, b, o)
+            delta = np.abs(following - current[:, :, None, :, :])
+            delta_ended = np.abs(ended[:, None, :, :] - current)
+            q = lineup_tensor[:, :24, :24] # (b, s, t)
+            swing[i, half] = (
+                np.einsum("bst,dstbo->dsbo", q, delta)
+                + lineup_tensor[:, :24, 24].T[None, :, :, None] * delta_ended
+            )
+    return swing
+
+def _calculate_occupancy(
+    away_tensor: npt.NDArray[np.float64],
+    home_tensor: npt.NDArray[np.float64],
+    innings: int,
+    extra_innings: bool,
+    max_diff: int,
+    tol: float,
+    max_steps: int,
+) -> npt.NDArray[np.float64]:
+    # 試合開始から各状況に到達する打席数の期待値
+    n = away_tensor.shape[0]
+    n_diffs = 2 * max_diff + 1
+    n_innings = innings + 1 if extra_innings else innings
+    occupancy = np.zeros((n_innings, 2, n_diffs, 24, n, n), dtype=np.float64)
+    diffs = np.arange(-max_diff, max_diff + 1)
+
+    # 攻撃開始時の分布 (得点差, 攻撃側の先頭打者, 守備側の先頭打者)
+    start_mass = np.zeros((n_diffs, n, n), dtype=np.float64)
+    start_mass[max_diff, 0, 0] = 1.0
+    inning = 0
+    while start_mass.sum() >= tol and (inning < innings or extra_innings) and inning < innings + max_steps:
+        i = min(inning, n_innings - 1)
+        is_final = inning >= innings - 1
+        start_state = 0 if inning < innings else EXTRA_INNING_STATE
+
+        # 表の攻撃
+        end_mass = _forward_half(
+            away_tensor, start_mass, start_state, -1, occupancy[i, 0], None, tol, max_steps
+        )
+        start_mass = end_mass.transpose(0, 2, 1)
+        if is_final:
+            start_mass[diffs > 0] = 0.0
+
+        # 裏の攻撃
+        end_mass = _forward_half(
+            home_tensor, start_mass, start_state, 1, occupancy[i, 1], diffs > 0 if is_final else None, tol, max_steps
+        )
+        start_mass = end_mass.transpose(0, 2, 1)
+        if is_final:
+            start_mass[diffs != 0] = 0.0
+        inning += 1
+    return occupancy
+
+def _forward_half(
+    lineup_tensor: npt.NDArray[np.float64],
+    start_mass: npt.NDArray[np.float64],
+    start_state: int,
+    sign: int,
+    occupancy: npt.NDArray[np.float64],
+    game_over: npt.NDArray[np.bool_] | None,
+    tol: float,
+    max_steps: int,
+) -> npt.NDArray[np.float64]:
+    # start_mass: (得点差, 攻撃側の打者, 守備側の先頭打者)
+    # 戻り値は攻撃終了時の (得点差, 攻撃側の次の先頭打者, 守備側の先頭打者)
+    n_diffs, n, _ = start_mass.shape
+    scores = cmn.STEP_SCORES[:24, :25]
+    transitions = [lineup_tensor[:, :24, :] * (scores == k) for k in range(scores.max() + 1)]
+
+    mass = np.zeros((n, n_diffs * n, 24), dtype=np.float64) # (打者, 得点差 x 守備側, 状態)
+    mass[:, :, start_state] = start_mass.transpose(1, 0, 2).reshape(n, n_diffs * n)
+    end_mass = np.zeros((n, n_diffs, n), dtype=np.float64)
+
+    for _ in range(max_steps):
+        occupancy += mass.reshape(n, n_diffs, n, 24).transpose(1, 3, 0, 2)
+        next_mass = np.zeros_like(mass)
+        for k, transition in enumerate(transitions):
+            moved = (mass @ transition).reshape(n, n_diffs, n, 25)
+            moved = np.roll(moved, 1, axis=0) # 次の打者へ
+            shifted = np.zeros_like(moved)
+            if sign > 0:
+                shifted[:, k:] = moved[:, :n_diffs - k]
+                shifted[:, -1] += moved[:, n_diffs - k:].sum(axis=1)
+            else:
+                shifted[:, :n_diffs - k] = moved[:, k:]
+                shifted[:, 0] += moved[:, :k].sum(axis=1)
+            end_mass += shifted[..., 24]
+            next_mass += shifted[..., :24].reshape(n, n_diffs * n, 24)
+        mass = next_mass
+        if game_over is not None:
+            mass.reshape(n, n_diffs, n, 24)[:, game_over] = 0.0 # サヨナラ
+        if mass.sum() < tol:
+            break
+    return end_mass.transpose(1, 0, 2)
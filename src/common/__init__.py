@@ -1,4 +1,4 @@
-from .types import Matrix, Vector, Model
+from .types import Matrix, Vector, Model, RunHistogram, SparseTransition
 from .constants import (
     REQUIRED_COLS,
     HIT_EVENTS,
@@ -13,5 +13,20 @@ from .constants import (
     BASE_STR_MAP,
     STATE_STR_MAP,
 )
-from .model_rules import RESULT_MAPPING, SCORE_MATRIX
+from .model_rules import RESULT_MAPPING, STRATEGY_MAPPING, SCORE_MATRIX, STEP_SCORES
 from .matrix_utils import normalize_transition_matrix, print_matrix_formatted
+from .state_utils import parse_state
+from .sparse_utils import to_sparse, to_dense, stack_sparse, pack_sparse_rows
+from .artifact_store import save_model_artifact, load_model_artifact, read_model_manifest
+from .table_writer import write_table_stream
+from .profiling import (
+    enable_profiling,
+    disable_profiling,
+    is_profiling_enabled,
+    get_profile_records,
+    summarize_profile,
+    export_profile,
+    record_metric,
+    profile_stage,
+    profiled,
+)
@@ -0,0 +1,109 @@
+import copy
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from .types import Model
+from .model_rules import RESULT_MAPPING
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+STORE_DIR = PROJECT_ROOT / "data" / "artifacts" / "store"
+REFS_DIR = STORE_DIR / "refs"
+MANIFEST_NAME = "manifest.json"
+
+def save_model_artifact(
+    model: Model,
+    seasons: list[int],
+    name: str | None = None,
+    mapping: dict[str, list[str]] = RESULT_MAPPING,
+) -> str:
+    # モデルを非圧縮の.npyで保存し、内容のハッシュを返す
+    # 同じ内容のモデルは同じハッシュになるので、2回目以降は書き込まない
+    # (ハッシュには seasons も含めるので、シーズンが違えば別のアーティファクトになる)
+    # mapping: モデルのキーと打席イベントの対応(作戦モデルは STRATEGY_MAPPING)
+    missing_results = set(mapping) - set(model)
+    if missing_results:
+        raise ValueError(f"Model is missing results: {missing_results}")
+    arrays = {r: np.ascontiguousarray(model[r], dtype=np.float64) for r in mapping}
+    if any(a.shape != (25, 25) for a in arrays.values()):
+        raise ValueError("Each model matrix must be of shape (25, 25)")
+
+    seasons = sorted(int(s) for s in seasons)
+    model_hash = _hash_model(arrays, mapping, seasons)
+    out_dir = STORE_DIR / model_hash
+    if not os.path.exists(out_dir):
+        os.makedirs(STORE_DIR, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=STORE_DIR, prefix=".tmp_"))
+        try:
+            for result, array in arrays.items():
+                np.save(tmp_dir / f"{result}.npy", array)
+            manifest = {
+                "hash": model_hash,
+                "seasons": seasons,
+                "result_mapping": mapping,
+            }
+            with open(tmp_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_dir, out_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            # 別のプロセスが同じモデルを先に書き込んだ場合
+            if not os.path.exists(out_dir):
+                raise
+
+    if name is not None:
+        _write_ref(name, model_hash)
+    return model_hash
+
+def load_model_artifact(key: str, mapping: dict[str, list[str]] = RESULT_MAPPING) -> Model:
+    # key はハッシュか、保存時に付けた名前
+    # 行列はmmapで開くので、同じモデルを読む複数のプロセスはページを共有する
+    return dict(_load_model(_resolve_key(key), json.dumps(mapping, sort_keys=True)))
+
+def read_model_manifest(key: str) -> dict:
+    # キャッシュした辞書を書き換えられないようにコピーを返す
+    return copy.deepcopy(_read_manifest(_resolve_key(key)))
+
+def _hash_model(arrays: dict[str, np.ndarray], mapping: dict[str, list[str]], seasons: list[int]) -> str:
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"result_mapping": mapping, "seasons": seasons}, sort_keys=True).encode())
+    for result, array in arrays.items():
+        digest.update(result.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+def _write_ref(name: str, model_hash: str) -> None:
+    os.makedirs(REFS_DIR, exist_ok=True)
+    tmp_path = REFS_DIR / f".{name}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(model_hash)
+    os.replace(tmp_path, REFS_DIR / name)
+
+def _resolve_key(key: str) -> str:
+    # 名前は付け替えられることがあるので、毎回ハッシュに解決する
+    ref_path = REFS_DIR / key
+    if os.path.exists(ref_path):
+        with open(ref_path, encoding="utf-8") as f:
+            return f.read().strip()
+    if os.path.exists(STORE_DIR / key / MANIFEST_NAME):
+        return key
+    raise FileNotFoundError(f"Model artifact not found: {key}")
+
+@lru_cache(maxsize=None)
+def _read_manifest(model_hash: str) -> dict:
+    with open(STORE_DIR / model_hash / MANIFEST_NAME, encoding="utf-8") as f:
+        return json.load(f)
+
+@lru_cache(maxsize=None)
+def _load_model(model_hash: str, mapping_json: str) -> Model:
+    # lru_cache のキーにするため、mapping はJSON文字列で受け取る
+    mapping = json.loads(mapping_json)
+    manifest = _read_manifest(model_hash)
+    if manifest["result_mapping"] != mapping:
+        raise ValueError(f"Model artifact {model_hash} was built with a different result mapping.")
+    model_dir = STORE_DIR / model_hash
+    return {result: np.load(model_dir / f"{result}.npy", mmap_mode="r") for result in mapping}
@@ -13,8 +13,9 @@ ON_BASE_EVENTS = ["walk", "hit_by_pitch"]
 STRIKEOUT_EVENTS = ["strikeout", "strikeout_double_play"]
 FIELD_OUT_EVENTS = [
     "field_out", "force_out", "fielders_choice_out", "grounded_into_double_play", "double_play", "triple_play",
-    "field_error", "fielders_choice", "sac_bunt_double_play", "sac_fly", "sac_fly_double_play"
+    "field_error", "fielders_choice", "sac_fly", "sac_fly_double_play"
 ]
+# 作戦のイベントは通常の打席結果には含めない(作戦モデルだけで数える)
 STRATEGY_EVENTS = ["sac_bunt", "sac_bunt_double_play", "intent_walk"]
 EXCLUDE_EVENTS = ["catcher_interf", "truncated_pa", "ejection", "game_advisory"]
 PA_EVENTS = HIT_EVENTS + ON_BASE_EVENTS + STRIKEOUT_EVENTS + FIELD_OUT_EVENTS + STRATEGY_EVENTS
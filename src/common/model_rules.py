@@ -13,6 +13,12 @@ RESULT_MAPPING = {
     "field_out": FIELD_OUT_EVENTS,
 }
 
+# 作戦の分類マッピング
+STRATEGY_MAPPING = {
+    "sac_bunt": ["sac_bunt", "sac_bunt_double_play"],
+    "intent_walk": ["intent_walk"],
+}
+
 def _create_score_matrix() -> npt.NDArray[np.int64]:
     score_matrix = np.zeros((25, 25), dtype=np.int64)
 
@@ -37,3 +43,6 @@ def _create_score_matrix() -> npt.NDArray[np.int64]:
             score_matrix[from_state, to_state] = score
     return score_matrix
 SCORE_MATRIX = _create_score_matrix()
+# 1回の遷移での得点 (3アウト遷移・不可能な遷移は0点)
+# シミュレーションと解析解はどちらもこの表を使う
+STEP_SCORES = np.maximum(SCORE_MATRIX, 0).astype(np.int8)
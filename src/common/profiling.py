@@ -0,0 +1,146 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+import pandas as pd
+
+F = TypeVar("F", bound=Callable[..., Any])
+ProfileCallback = Callable[[dict[str, Any]], None]
+
+# 計測は enable_profiling を呼んだときだけ行う(無効時は分岐1回分のコストのみ)
+_records: list[dict[str, Any]] | None = None
+_callback: ProfileCallback | None = None
+_trace_memory: bool = False
+_owns_tracemalloc: bool = False
+# 入れ子の処理のスタックはスレッドごとに持つ(スレッドプールの中で計測しても混ざらないようにする)
+_local = threading.local()
+
+def enable_profiling(callback: ProfileCallback | None = None, trace_memory: bool = False) -> None:
+    # callback を渡すと、記録を1件ごとに渡す
+    # trace_memory=True でピークメモリも計測する(tracemallocを使うため遅くなる)
+    global _records, _callback, _trace_memory, _owns_tracemalloc
+    disable_profiling()
+    _records = []
+    _callback = callback
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _owns_tracemalloc = True
+
+def disable_profiling() -> None:
+    global _records, _callback, _trace_memory, _owns_tracemalloc
+    if _owns_tracemalloc:
+        tracemalloc.stop()
+        _owns_tracemalloc = False
+    _records = None
+    _callback = None
+    _trace_memory = False
+    _get_stack().clear()
+
+def is_profiling_enabled() -> bool:
+    return _records is not None
+
+def get_profile_records() -> list[dict[str, Any]]:
+    return list(_records) if _records is not None else []
+
+def summarize_profile() -> pd.DataFrame:
+    # 処理ごとの呼び出し回数、合計時間、処理行数、ピークメモリ
+    timed = [r for r in get_profile_records() if "seconds" in r]
+    columns = ["stage", "calls", "seconds", "rows", "peak_mib"]
+    if not timed:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(timed).reindex(columns=["stage", "seconds", "rows", "peak_mib"])
+    summary = df.groupby("stage", sort=False).agg(
+        calls=("seconds", "size"),
+        seconds=("seconds", "sum"),
+        rows=("rows", lambda rows: rows.sum(min_count=1)),
+        peak_mib=("peak_mib", "max"),
+    )
+    return summary.reset_index()[columns]
+
+def export_profile(path: str | Path) -> None:
+    os.makedirs(Path(path).parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_profile_records(), f, indent=2, default=_to_json)
+
+def record_metric(stage: str, **values: Any) -> None:
+    # 時間以外の値(反復ごとの未完了試行数など)を記録する
+    if _records is None:
+        return
+    _emit({"stage": _qualified_name(stage), **values})
+
+@contextmanager
+def profile_stage(stage: str, rows: int | None = None) -> Iterator[dict[str, Any]]:
+    # 渡される辞書に値を入れると、処理の記録に追加される
+    extra: dict[str, Any] = {}
+    if _records is None:
+        yield extra
+        return
+
+    stack = _get_stack()
+    frame = {"name": stage, "child_peak": 0, "start_memory": 0}
+    if _trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+        tracemalloc.reset_peak()
+        frame["start_memory"] = current
+    name = _qualified_name(stage)
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        record: dict[str, Any] = {"stage": name, "seconds": seconds, "rows": rows, **extra}
+        if _trace_memory:
+            # 入れ子の処理でピークをリセットしても、外側の処理のピークは失わないようにする
+            peak = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+            tracemalloc.reset_peak()
+            if stack:
+                stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+            record["peak_mib"] = (peak - frame["start_memory"]) / 2**20
+        _emit(record)
+
+def profiled(stage: str) -> Callable[[F], F]:
+    # 関数の実行をstageとして計測するデコレータ
+    # 処理行数は、最初の引数(なければ戻り値)がDataFrameならその行数とする
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _records is None:
+                return func(*args, **kwargs)
+            rows = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+            with profile_stage(stage, rows=rows) as extra:
+                result = func(*args, **kwargs)
+                if rows is None and isinstance(result, pd.DataFrame):
+                    extra["rows"] = len(result)
+            return result
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+def _qualified_name(stage: str) -> str:
+    # 入れ子の処理は "外側/内側" の名前で記録する
+    return "/".join([frame["name"] for frame in _get_stack()] + [stage])
+
+def _get_stack() -> list[dict[str, Any]]:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _emit(record: dict[str, Any]) -> None:
+    _records.append(record)
+    if _callback is not None:
+        _callback(record)
+
+def _to_json(value: Any) -> Any:
+    # NumPyのスカラーや配列をJSONに変換する
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,73 @@
+import numpy as np
+import numpy.typing as npt
+from .types import SparseTransition
+from .model_rules import STEP_SCORES
+
+def to_sparse(matrices: npt.NDArray[np.float64]) -> SparseTransition:
+    # matrices: (25, 25) または (..., 25, 25)
+    matrices = np.asarray(matrices, dtype=np.float64)
+    if matrices.ndim < 2 or matrices.shape[-2:] != (25, 25):
+        raise ValueError("matrices must be of shape (..., 25, 25)")
+
+    dense_rows = matrices.reshape(-1, 25)
+    rows, targets = np.nonzero(dense_rows > 0)
+    indptr = np.zeros(dense_rows.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=dense_rows.shape[0]), out=indptr[1:])
+    return SparseTransition(
+        indptr=indptr,
+        targets=targets.astype(np.int8),
+        probs=dense_rows[rows, targets],
+        runs=STEP_SCORES[rows % 25, targets],
+    )
+
+def to_dense(sparse: SparseTransition) -> npt.NDArray[np.float64]:
+    # 戻り値: (行列数, 25, 25)
+    _validate_sparse(sparse)
+    n_rows = sparse.indptr.size - 1
+    rows = np.repeat(np.arange(n_rows), np.diff(sparse.indptr))
+    dense_rows = np.zeros((n_rows, 25), dtype=np.float64)
+    dense_rows[rows, sparse.targets] = sparse.probs
+    return dense_rows.reshape(-1, 25, 25)
+
+def stack_sparse(sparse_list: list[SparseTransition]) -> SparseTransition:
+    # 選手ごとの行列を打順として重ねる
+    if len(sparse_list) == 0:
+        raise ValueError("sparse_list must not be empty")
+    for sparse in sparse_list:
+        _validate_sparse(sparse)
+
+    offsets = np.cumsum([0] + [s.indptr[-1] for s in sparse_list[:-1]])
+    indptr = np.concatenate(
+        [[0]] + [s.indptr[1:] + offset for s, offset in zip(sparse_list, offsets)]
+    ).astype(np.int64)
+    return SparseTransition(
+        indptr=indptr,
+        targets=np.concatenate([s.targets for s in sparse_list]),
+        probs=np.concatenate([s.probs for s in sparse_list]),
+        runs=np.concatenate([s.runs for s in sparse_list]),
+    )
+
+def pack_sparse_rows(sparse: SparseTransition) -> tuple[npt.NDArray[np.int8], npt.NDArray[np.float64]]:
+    # 各行の要素を、最大の要素数Kに揃えた (行数, K) の表に詰める
+    # 要素のない行は3アウト(24)への遷移とし、各行の確率は合計1に正規化する
+    _validate_sparse(sparse)
+    n_rows = sparse.indptr.size - 1
+    counts = np.diff(sparse.indptr)
+    width = max(int(counts.max()), 1)
+    rows = np.repeat(np.arange(n_rows), counts)
+    columns = np.arange(sparse.indptr[-1]) - np.repeat(sparse.indptr[:-1], counts)
+
+    targets = np.full((n_rows, width), 24, dtype=np.int8)
+    probs = np.zeros((n_rows, width), dtype=np.float64)
+    targets[rows, columns] = sparse.targets
+    probs[rows, columns] = sparse.probs
+    probs[counts == 0, 0] = 1.0
+    probs /= probs.sum(axis=1, keepdims=True)
+    return targets, probs
+
+def _validate_sparse(sparse: SparseTransition) -> None:
+    if (sparse.indptr.size - 1) % 25 != 0:
+        raise ValueError("SparseTransition must have a multiple of 25 rows")
+    nnz = sparse.indptr[-1]
+    if not (sparse.targets.size == sparse.probs.size == sparse.runs.size == nnz):
+        raise ValueError("SparseTransition arrays must have the same length as indptr[-1]")
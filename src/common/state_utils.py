@@ -0,0 +1,10 @@
+from .constants import STATE_STR_MAP
+
+_STATE_STR_MAP_INV: dict[str, int] = {v: k for k, v in STATE_STR_MAP.items()}
+
+def parse_state(state: str | int) -> int:
+    if isinstance(state, str):
+        if state not in _STATE_STR_MAP_INV:
+            raise ValueError(f"Invalid state string: {state}")
+        return _STATE_STR_MAP_INV[state]
+    return int(state)
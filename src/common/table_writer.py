@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Literal
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+def write_table_stream(
+    tables: Iterable["pa.Table"],
+    output_path: str | Path,
+    file_format: Literal["parquet", "arrow"] = "parquet",
+) -> None:
+    # 表を1つずつParquetまたはArrow(IPCファイル)に書き出す
+    # スキーマは最初の表に合わせ、一時ファイルに書き終えてから置き換える
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError(f"Invalid file_format: {file_format} (must be 'parquet' or 'arrow')")
+    # pyarrow は書き出すときだけ必要なので、src.common の読み込み時には読み込まない
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    out_path = Path(output_path)
+    os.makedirs(out_path.parent, exist_ok=True)
+    tmp_path = out_path.with_suffix(out_path.suffix + ".tmp")
+
+    writer = None
+    schema = None
+    try:
+        for table in tables:
+            if writer is None:
+                schema = table.schema
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                else:
+                    writer = pa.ipc.new_file(tmp_path, schema)
+            writer.write_table(table.cast(schema))
+        if writer is None:
+            raise ValueError("tables must not be empty")
+        writer.close()
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, out_path)
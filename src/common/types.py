@@ -1,7 +1,48 @@
-from typing import TypeAlias
+from typing import NamedTuple, TypeAlias
 import numpy as np
 import numpy.typing as npt
 
 Matrix: TypeAlias = npt.NDArray[np.float64]
 Vector: TypeAlias = npt.NDArray[np.float64]
 Model: TypeAlias = dict[str, Matrix]
+
+class RunHistogram(NamedTuple):
+    counts: npt.NDArray[np.int64] # counts[r] = 得点がrだった試行数
+
+    @classmethod
+    def from_runs(cls, runs: npt.NDArray[np.integer]) -> "RunHistogram":
+        return cls(np.bincount(np.asarray(runs).ravel(), minlength=1).astype(np.int64))
+
+    def merge(self, other: "RunHistogram") -> "RunHistogram":
+        # 長さの異なるヒストグラムも足し合わせる
+        length = max(self.counts.size, other.counts.size)
+        counts = np.zeros(length, dtype=np.int64)
+        counts[:self.counts.size] += self.counts
+        counts[:other.counts.size] += other.counts
+        return RunHistogram(counts)
+
+    # 得点は整数なので、ヒストグラムから平均・分散を厳密に求められる
+    @property
+    def num_trials(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def mean(self) -> float:
+        return float(np.arange(self.counts.size) @ self.counts / self.num_trials)
+
+    @property
+    def variance(self) -> float:
+        runs = np.arange(self.counts.size)
+        return float(((runs - self.mean) ** 2) @ self.counts / self.num_trials)
+
+class SparseTransition(NamedTuple):
+    # 遷移行列を行ごとの (遷移先, 確率, 得点) のリストで表す(CSR形式)
+    # 複数の行列を重ねた場合、行番号は 行列番号 * 25 + 状態
+    indptr: npt.NDArray[np.int64] # 行iの要素は indptr[i]:indptr[i+1]
+    targets: npt.NDArray[np.int8]
+    probs: npt.NDArray[np.float64]
+    runs: npt.NDArray[np.int8] # STEP_SCORES から求めた得点(3アウト遷移・不可能な遷移は0点)
+
+    @property
+    def n_matrices(self) -> int:
+        return (self.indptr.size - 1) // 25
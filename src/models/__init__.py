@@ -1,4 +1,14 @@
-from src.models.statcast_loader import load_statcast
-from src.models.state import assign_state_features
-from src.models.transition import aggregate_count_matrices, build_model, save_model
+from src.models.statcast_loader import load_statcast, fetch_statcast_partitions
+from src.models.state import assign_state_features, assign_state_features_fast
+from src.models.transition import (
+    aggregate_count_matrices,
+    aggregate_count_tensor,
+    build_model,
+    build_strategy_model,
+    sample_model_replicates,
+    save_model,
+    save_count_matrices,
+    load_count_matrices,
+)
 from src.models.dl_model import create_dl_model
+from src.models.synthetic import generate_synthetic_statcast
@@ -1,20 +1,31 @@
 import os
 import time
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import Callable
 import pandas as pd
 from tqdm import tqdm
-from pybaseball import statcast, cache
 from src.common.constants import REQUIRED_COLS
+from src.common.profiling import profiled
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 STATCAST_DATA_DIR = PROJECT_ROOT / "data" / "statcast"
+SEASON_MONTHS = range(3, 12)
 
+# Statcastデータの取得元: (開始日, 終了日) -> DataFrame
+StatcastSource = Callable[[str, str], pd.DataFrame]
+
+@profiled("load_statcast")
 def load_statcast(
     start_year: int,
     end_year: int | None = None,
     columns: list[str] | None = None,
+    source: StatcastSource | None = None,
+    max_workers: int = 4,
+    requests_per_second: float = 1.0,
 ) -> pd.DataFrame:
     if end_year is None:
         end_year = start_year
@@ -22,7 +33,7 @@ def load_statcast(
     years = range(start_year, end_year + 1)
 
     for year in years:
-        _cache_season_statcast(year)
+        _cache_season_statcast(year, source, max_workers, requests_per_second)
 
     df_list = []
     for year in years:
@@ -41,30 +52,102 @@ def _read_season_statcast(year: int, columns: list[str]) -> pd.DataFrame:
     _validate_columns(df, columns)
     return df
 
-def _cache_season_statcast(year: int) -> None:
+@profiled("fetch_statcast_partitions")
+def fetch_statcast_partitions(
+    year: int,
+    source: StatcastSource | None = None,
+    max_workers: int = 4,
+    requests_per_second: float = 1.0,
+) -> list[Path]:
+    if max_workers <= 0:
+        raise ValueError("max_workers must be positive")
+    if requests_per_second <= 0:
+        raise ValueError("requests_per_second must be positive")
+    if source is None:
+        source = _pybaseball_source()
+
+    partition_dir = STATCAST_DATA_DIR / str(year)
+    os.makedirs(partition_dir, exist_ok=True)
+    partitions = {month: partition_dir / f"statcast_{year}_{month:02d}.parquet" for month in SEASON_MONTHS}
+
+    # 保存済みの月はスキップして、残りの月だけを並列に取得する
+    pending = [month for month, path in partitions.items() if not os.path.exists(path)]
+    wait_for_slot = _make_rate_limiter(requests_per_second)
+
+    def fetch_month(month: int) -> None:
+        start_date = datetime(year, month, 1)
+        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
+        wait_for_slot()
+        df_month = source(start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+        _write_partition(df_month, partitions[month])
+
+    failed: dict[int, Exception] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_month, month): month for month in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=f"Downloading Statcast data for {year}"):
+            month = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed[month] = e
+
+    if failed:
+        months = sorted(failed)
+        raise RuntimeError(
+            f"Failed to download Statcast data for {year}, months {months}. "
+            "Downloaded months are kept and will be skipped on retry."
+        ) from failed[months[0]]
+    return list(partitions.values())
+
+def _cache_season_statcast(
+    year: int,
+    source: StatcastSource | None = None,
+    max_workers: int = 4,
+    requests_per_second: float = 1.0,
+) -> None:
     os.makedirs(STATCAST_DATA_DIR, exist_ok=True)
     file_path = STATCAST_DATA_DIR / f"statcast_{year}.parquet"
 
     if os.path.exists(file_path):
         return
 
+    partition_paths = fetch_statcast_partitions(year, source, max_workers, requests_per_second)
+    df_list = [pd.read_parquet(path) for path in partition_paths]
+    df = pd.concat(df_list, ignore_index=True)
+    _write_partition(df, file_path)
+
+def _pybaseball_source() -> StatcastSource:
+    # pybaseball は取得元を指定しない場合だけ使うので、ここで読み込む
+    from pybaseball import statcast, cache
     cache.enable()
     warnings.filterwarnings("ignore", category=FutureWarning, module="pybaseball")
-    months = range(3, 12)
-    df_list = []
 
-    for month in tqdm(months, desc=f"Downloading Statcast data for {year}"):
-        start_date = datetime(year, month, 1)
-        end_date = datetime(year, month + 1, 1) - timedelta(days=1)
-        str_start_date = start_date.strftime("%Y-%m-%d")
-        str_end_date = end_date.strftime("%Y-%m-%d")
+    def fetch(start_dt: str, end_dt: str) -> pd.DataFrame:
+        return statcast(start_dt=start_dt, end_dt=end_dt, verbose=False)
 
-        df_month = statcast(start_dt=str_start_date, end_dt=str_end_date, verbose=False)
-        df_list.append(df_month)
-        time.sleep(1)
+    return fetch
 
-    df = pd.concat(df_list, ignore_index=True)
-    df.to_parquet(file_path)
+def _make_rate_limiter(requests_per_second: float) -> Callable[[], None]:
+    # リクエストの開始間隔を 1 / requests_per_second 秒以上あける
+    interval = 1.0 / requests_per_second
+    lock = threading.Lock()
+    next_time = [time.monotonic()]
+
+    def wait_for_slot() -> None:
+        with lock:
+            now = time.monotonic()
+            wait = next_time[0] - now
+            next_time[0] = max(now, next_time[0]) + interval
+        if wait > 0:
+            time.sleep(wait)
+
+    return wait_for_slot
+
+def _write_partition(df: pd.DataFrame, file_path: Path) -> None:
+    # 書き込み途中で中断しても壊れたファイルが残らないように、一時ファイルから置き換える
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, file_path)
 
 def _validate_columns(df: pd.DataFrame, required_columns: list[str]) -> None:
     required_columns = set(required_columns)
@@ -1,9 +1,18 @@
 from typing import Literal
 import warnings
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 from src.common.constants import BASE_BIT_MAP, STATE_STR_MAP, PA_EVENTS
 from src.common.model_rules import SCORE_MATRIX
+from src.common.profiling import profiled
 
+# 塁状況のビット表現 -> 塁状況のインデックス
+_BASE_INDEX_BY_BITS = np.array(
+    [{v: k for k, v in BASE_BIT_MAP.items()}[bits] for bits in range(8)], dtype=np.int8
+)
+
+@profiled("assign_state_features")
 def assign_state_features(df: pd.DataFrame) -> pd.DataFrame:
     return (
         df.pipe(_assign_state)
@@ -13,6 +22,70 @@ def assign_state_features(df: pd.DataFrame) -> pd.DataFrame:
           .pipe(_validate_transition, mode="drop")
     )
 
+@profiled("assign_state_features_fast")
+def assign_state_features_fast(df: pd.DataFrame, include_str: bool = False) -> pd.DataFrame:
+    # assign_state_features と同じ遷移を、打席が完了した行だけについて返す
+    # 中間のSeriesを作らずにNumPy配列で処理し、stateはint8、eventsはcategoryで持つ
+    order = np.lexsort((
+        df["pitch_number"].to_numpy(),
+        df["at_bat_number"].to_numpy(),
+        df["game_pk"].to_numpy(),
+    ))
+    game_pk = df["game_pk"].to_numpy()[order]
+    inning = df["inning"].to_numpy()[order]
+    is_bot = (df["inning_topbot"] == "Bot").to_numpy()[order]
+    state = _compute_states(df, order)
+
+    # 次の状態は次の行(投球)から決まるので、全行のstateを求めてから打席完了行に絞る
+    pa_rows = np.flatnonzero(df["events"].notna().to_numpy()[order])
+    next_rows = np.minimum(pa_rows + 1, len(order) - 1)
+    has_next = pa_rows + 1 < len(order)
+    is_game_end = ~has_next | (game_pk[next_rows] != game_pk[pa_rows])
+    is_inning_end = (
+        is_game_end
+        | (inning[next_rows] != inning[pa_rows])
+        | (is_bot[next_rows] != is_bot[pa_rows])
+    )
+    pa_index = order[pa_rows]
+    is_walkoff = (
+        is_game_end
+        & is_bot[pa_rows]
+        & (df["post_home_score"].to_numpy()[pa_index] > df["post_away_score"].to_numpy()[pa_index])
+    )
+    next_state = np.where(is_inning_end, 24, state[next_rows]).astype(np.int8) # 3アウト
+    next_state[is_walkoff] = -1 # サヨナラ
+
+    pa_df = df.iloc[pa_index].reset_index(drop=True)
+    pa_df["events"] = pa_df["events"].astype("category")
+    pa_df["state"] = state[pa_rows]
+    pa_df["next_state"] = next_state
+    if include_str:
+        pa_df = pa_df.pipe(_assign_state_str).pipe(_assign_next_state_str)
+    return _validate_transition_fast(pa_df)
+
+def _compute_states(df: pd.DataFrame, order: npt.NDArray[np.int64]) -> npt.NDArray[np.int8]:
+    base_bits = (
+        df["on_1b"].notna().to_numpy()[order].astype(np.int8)
+        | (df["on_2b"].notna().to_numpy()[order].astype(np.int8) << 1)
+        | (df["on_3b"].notna().to_numpy()[order].astype(np.int8) << 2)
+    )
+    outs = df["outs_when_up"].to_numpy()[order].astype(np.int8)
+    return outs * 8 + _BASE_INDEX_BY_BITS[base_bits]
+
+def _validate_transition_fast(df: pd.DataFrame) -> pd.DataFrame:
+    # _validate_transition(mode="drop") と同じ判定
+    state = df["state"].to_numpy()
+    next_state = df["next_state"].to_numpy()
+    is_pa_event = df["events"].isin(PA_EVENTS).to_numpy()
+    estimated_scores = SCORE_MATRIX[state, next_state].astype(np.int8) - (~is_pa_event).astype(np.int8)
+    actual_scores = (df["post_bat_score"].to_numpy() - df["bat_score"].to_numpy()).astype(np.int8)
+
+    is_valid_transition = (estimated_scores == actual_scores) | (next_state == 24) | (next_state == -1)
+    df["estimated_score"] = estimated_scores
+    df["actual_score"] = actual_scores
+    return df[is_valid_transition].reset_index(drop=True)
+
+@profiled("_assign_state")
 def _assign_state(df: pd.DataFrame) -> pd.DataFrame:
     base_bit_map_inv: dict[int, int] = {v: k for k, v in BASE_BIT_MAP.items()}
     outs = df["outs_when_up"].astype(int)
@@ -26,6 +99,7 @@ def _assign_state(df: pd.DataFrame) -> pd.DataFrame:
     df["state"] = state.astype(int)
     return df
 
+@profiled("_assign_next_state")
 def _assign_next_state(df: pd.DataFrame) -> pd.DataFrame:
     df = _sort_statcast_df(df)
 
@@ -52,14 +126,17 @@ def _assign_next_state(df: pd.DataFrame) -> pd.DataFrame:
     df["next_state"] = next_state.fillna(-1).astype(int)
     return df
 
+@profiled("_assign_state_str")
 def _assign_state_str(df: pd.DataFrame) -> pd.DataFrame:
     df["state_str"] = df["state"].map(STATE_STR_MAP)
     return df
 
+@profiled("_assign_next_state_str")
 def _assign_next_state_str(df: pd.DataFrame) -> pd.DataFrame:
     df["next_state_str"] = df["next_state"].map(STATE_STR_MAP)
     return df
 
+@profiled("_validate_transition")
 def _validate_transition(
     df: pd.DataFrame,
     mode: Literal["raise", "warn", "ignore", "drop", "return"] = "raise"
@@ -0,0 +1,212 @@
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+from src.common.constants import REQUIRED_COLS, BASE_BIT_MAP
+from src.common.model_rules import STEP_SCORES
+from src.models.dl_model import create_dl_model
+
+# リーグ平均程度の打席結果の割合 (打席結果, 確率)
+SYNTHETIC_EVENT_RATES = {
+    "single": 0.140, "double": 0.044, "triple": 0.004, "home_run": 0.030,
+    "walk": 0.080, "hit_by_pitch": 0.011, "strikeout": 0.225,
+    "field_out": 0.400, "grounded_into_double_play": 0.016, "sac_fly": 0.007,
+    "force_out": 0.025, "field_error": 0.008, "sac_bunt": 0.004, "intent_walk": 0.003,
+    "catcher_interf": 0.001, "truncated_pa": 0.002,
+}
+GAMES_PER_SEASON = 2430
+TEAMS = [
+    "ARI", "ATL", "BAL", "BOS", "CHC", "CWS", "CIN", "CLE", "COL", "DET",
+    "HOU", "KC", "LAA", "LAD", "MIA", "MIL", "MIN", "NYM", "NYY", "ATH",
+    "PHI", "PIT", "SD", "SF", "SEA", "STL", "TB", "TEX", "TOR", "WSH",
+]
+_RUNNER_ID = 600000.0
+
+def generate_synthetic_statcast(
+    n_seasons: float = 1.0,
+    n_games: int | None = None,
+    innings: int = 9,
+    seed: int | None = None,
+) -> pd.DataFrame:
+    if n_games is None:
+        n_games = int(round(n_seasons * GAMES_PER_SEASON))
+    if n_games <= 0:
+        raise ValueError("n_games must be positive")
+    rng = np.random.default_rng(seed)
+
+    transitions = _event_transitions()
+    pa_records = _simulate_plate_appearances(n_games, innings, transitions, rng)
+    return _expand_pitches(pa_records, rng)
+
+def _event_transitions() -> tuple[list[str], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    # 打席結果ごとの遷移行列(単純な進塁モデルに併殺などを加えたもの)
+    dl_model = create_dl_model()
+    event_groups = {
+        "single": "single", "double": "double", "triple": "triple", "home_run": "home_run",
+        "walk": "walk", "hit_by_pitch": "walk", "intent_walk": "walk", "catcher_interf": "walk",
+        "strikeout": "strikeout", "field_out": "field_out", "force_out": "field_out",
+        "sac_fly": "field_out", "sac_bunt": "field_out", "truncated_pa": "field_out",
+        "field_error": "walk",
+    }
+    events = list(SYNTHETIC_EVENT_RATES)
+    matrices = []
+    for event in events:
+        if event == "grounded_into_double_play":
+            matrices.append(_double_play_matrix())
+        else:
+            matrices.append(dl_model[event_groups[event]])
+    rates = np.array(list(SYNTHETIC_EVENT_RATES.values()))
+    return events, np.stack(matrices), rates / rates.sum()
+
+def _double_play_matrix() -> npt.NDArray[np.float64]:
+    # 1塁走者がいれば打者と1塁走者がアウト、いなければ通常の凡打
+    base_bit_map_inv = {v: k for k, v in BASE_BIT_MAP.items()}
+    matrix = np.zeros((25, 25), dtype=np.float64)
+    for from_state in range(25):
+        outs, base_bit = from_state // 8, BASE_BIT_MAP[from_state % 8]
+        if from_state < 24 and base_bit & 0b001:
+            to_outs, to_bit = outs + 2, base_bit & 0b110
+        else:
+            to_outs, to_bit = outs + 1, base_bit
+        to_state = 24 if to_outs >= 3 else to_outs * 8 + base_bit_map_inv[to_bit]
+        matrix[from_state, min(to_state, 24)] = 1.0
+    return matrix
+
+def _simulate_plate_appearances(
+    n_games: int,
+    innings: int,
+    transitions: tuple[list[str], npt.NDArray[np.float64], npt.NDArray[np.float64]],
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    events, matrices, rates = transitions
+    next_state_table = matrices.argmax(axis=2) # すべて決定的な遷移
+    scores = STEP_SCORES.astype(np.int64)
+
+    home_scores = np.zeros(n_games, dtype=np.int64)
+    away_scores = np.zeros(n_games, dtype=np.int64)
+    records = []
+    live = np.arange(n_games)
+    inning = 1
+    while live.size > 0:
+        for half in (0, 1):
+            is_final = inning >= innings
+            batting = live
+            if half == 1 and is_final:
+                batting = live[home_scores[live] <= away_scores[live]]
+            start_state = 0 if inning <= innings else 2
+            limits = (away_scores[batting] - home_scores[batting]) if half == 1 and is_final else None
+            runs = _simulate_half(
+                batting, inning, half, start_state, limits, next_state_table, scores, rates, rng, records
+            )
+            if half == 0:
+                away_scores[batting] += runs
+            else:
+                home_scores[batting] += runs
+        if inning >= innings:
+            live = live[home_scores[live] == away_scores[live]]
+        inning += 1
+
+    pa = pd.concat(records, ignore_index=True)
+    pa["events"] = np.array(events, dtype=object)[pa["event_code"].to_numpy()]
+    return pa.drop(columns="event_code")
+
+def _simulate_half(
+    games: npt.NDArray[np.int64],
+    inning: int,
+    half: int,
+    start_state: int,
+    limits: npt.NDArray[np.int64] | None,
+    next_state_table: npt.NDArray[np.int64],
+    scores: npt.NDArray[np.int64],
+    rates: npt.NDArray[np.float64],
+    rng: np.random.Generator,
+    records: list[pd.DataFrame],
+) -> npt.NDArray[np.int64]:
+    total_runs = np.zeros(games.size, dtype=np.int64)
+    live = np.arange(games.size)
+    states = np.full(games.size, start_state, dtype=np.int64)
+    cumulative_rates = np.cumsum(rates)
+    step = 0
+    while live.size > 0:
+        event_codes = np.minimum(np.searchsorted(cumulative_rates, rng.random(live.size)), len(rates) - 1)
+        next_states = next_state_table[event_codes, states]
+        runs = scores[states, next_states]
+        records.append(pd.DataFrame({
+            "game": games[live], "inning": inning, "half": half, "pa_index": step,
+            "state": states, "runs": runs, "event_code": event_codes,
+        }))
+        total_runs[live] += runs
+        finished = next_states == 24
+        if limits is not None:
+            finished |= total_runs[live] > limits[live]
+        live = live[~finished]
+        states = next_states[~finished]
+        step += 1
+    return total_runs
+
+def _expand_pitches(pa: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    pa = pa.sort_values(["game", "inning", "half", "pa_index"], kind="stable").reset_index(drop=True)
+    n_games = int(pa["game"].max()) + 1
+
+    # 各打席の開始時点での得点
+    last_runs = pa["runs"].to_numpy()
+    away_score = _carry_total(pa, 0)
+    home_score = _carry_total(pa, 1)
+    is_top = pa["half"].to_numpy() == 0
+
+    n_pitches = np.minimum(1 + rng.poisson(2.9, size=len(pa)), 12)
+    rows = np.repeat(np.arange(len(pa)), n_pitches)
+    pitch_number = np.arange(rows.size) - np.repeat(np.cumsum(n_pitches) - n_pitches, n_pitches) + 1
+    is_last = pitch_number == n_pitches[rows]
+
+    state = pa["state"].to_numpy()[rows]
+    outs = state // 8
+    base_bits = np.array([BASE_BIT_MAP[b] for b in range(8)])[state % 8]
+    runner = lambda bit: np.where(base_bits & bit, _RUNNER_ID, np.nan)
+    runs = np.where(is_last, last_runs[rows], 0)
+    top = is_top[rows]
+    bat_score = np.where(top, away_score[rows], home_score[rows])
+    fld_score = np.where(top, home_score[rows], away_score[rows])
+    game = pa["game"].to_numpy()[rows]
+
+    at_bat_number = pa.groupby("game").cumcount().to_numpy() + 1
+    balls = np.minimum((pitch_number - 1) // 2, 3)
+    strikes = np.minimum(pitch_number - 1 - balls, 2)
+    events = np.where(is_last, pa["events"].to_numpy()[rows], None)
+    description = np.where(is_last, "hit_into_play", np.where(pitch_number % 2 == 0, "ball", "foul"))
+
+    home_idx = np.arange(n_games) % len(TEAMS)
+    away_idx = (np.arange(n_games) * 7 + 3) % len(TEAMS)
+    away_idx = np.where(away_idx == home_idx, (away_idx + 1) % len(TEAMS), away_idx)
+    dates = pd.Timestamp("2025-03-27") + pd.to_timedelta(np.arange(n_games) // 15 % 186, unit="D")
+    seasons = np.arange(n_games) // GAMES_PER_SEASON
+
+    df = pd.DataFrame({
+        "game_date": (dates - pd.to_timedelta(seasons * 365, unit="D")).strftime("%Y-%m-%d")[game],
+        "home_team": np.array(TEAMS)[home_idx][game],
+        "away_team": np.array(TEAMS)[away_idx][game],
+        "game_type": "R",
+        "game_pk": 700000 + game,
+        "inning": pa["inning"].to_numpy()[rows],
+        "inning_topbot": np.where(top, "Top", "Bot"),
+        "at_bat_number": at_bat_number[rows],
+        "pitch_number": pitch_number,
+        "outs_when_up": outs,
+        "balls": balls,
+        "strikes": strikes,
+        "on_1b": runner(0b001),
+        "on_2b": runner(0b010),
+        "on_3b": runner(0b100),
+        "bat_score": bat_score.astype(np.int64),
+        "post_bat_score": (bat_score + runs).astype(np.int64),
+        "fld_score": fld_score.astype(np.int64),
+        "post_home_score": np.where(top, home_score[rows], home_score[rows] + runs).astype(np.int64),
+        "post_away_score": np.where(top, away_score[rows] + runs, away_score[rows]).astype(np.int64),
+        "events": events,
+        "description": description,
+    })
+    return df[REQUIRED_COLS]
+
+def _carry_total(pa: pd.DataFrame, half: int) -> npt.NDArray[np.float64]:
+    # 各打席の時点での、指定チームの累積得点
+    team_runs = np.where(pa["half"] == half, pa["runs"], 0)
+    return (pd.Series(team_runs).groupby(pa["game"]).cumsum() - team_runs).to_numpy()
@@ -5,22 +5,64 @@ import numpy.typing as npt
 import pandas as pd
 from src.common.types import Model
 from src.common.constants import PA_EVENTS
-from src.common.model_rules import RESULT_MAPPING
+from src.common.model_rules import RESULT_MAPPING, STRATEGY_MAPPING
 from src.common.matrix_utils import normalize_transition_matrix
+from src.common.profiling import profiled
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 ARTIFACTS_DIR = PROJECT_ROOT / "data" / "artifacts"
+COUNTS_DIR = ARTIFACTS_DIR / "counts"
 
+# 遷移回数を集計する打席結果(PA_EVENTSの重複を除いたもの)
+COUNT_EVENTS = list(dict.fromkeys(PA_EVENTS))
+
+@profiled("aggregate_count_matrices")
 def aggregate_count_matrices(df: pd.DataFrame) -> dict[str, npt.NDArray[np.int64]]:
-    count_matrices: dict[str, npt.NDArray[np.int64]] = {}
-    for event in PA_EVENTS:
-        df_filtered = df[df["events"] == event]
-        counts = pd.crosstab(df_filtered["state"], df_filtered["next_state"])
-        counts = counts.reindex(index=range(25), columns=range(25), fill_value=0)
-        count_matrix = counts.to_numpy(dtype=np.int64)
-        count_matrices[event] = count_matrix
-    return count_matrices
+    count_tensor = aggregate_count_tensor(df)
+    return {event: count_tensor[i] for i, event in enumerate(COUNT_EVENTS)}
+
+def aggregate_count_tensor(df: pd.DataFrame) -> npt.NDArray[np.int64]:
+    # (打席結果, state, next_state) を1つの整数に符号化し、1回のbincountで集計する
+    # 戻り値: (len(COUNT_EVENTS), 25, 25)
+    event_codes = pd.Categorical(df["events"], categories=COUNT_EVENTS).codes.astype(np.int64)
+    states = df["state"].to_numpy(dtype=np.int64)
+    next_states = df["next_state"].to_numpy(dtype=np.int64)
+
+    is_valid = (
+        (event_codes >= 0)
+        & (states >= 0) & (states < 25)
+        & (next_states >= 0) & (next_states < 25) # サヨナラ(-1)は除く
+    )
+    codes = (event_codes[is_valid] * 25 + states[is_valid]) * 25 + next_states[is_valid]
+    counts = np.bincount(codes, minlength=len(COUNT_EVENTS) * 25 * 25)
+    return counts.reshape(len(COUNT_EVENTS), 25, 25).astype(np.int64)
+
+def save_count_matrices(count_matrices: dict[str, npt.NDArray[np.int64]], name: str) -> None:
+    # シーズンごとに保存した回数は、足し合わせるだけで複数シーズンの回数になる
+    missing_events = set(COUNT_EVENTS) - set(count_matrices)
+    if missing_events:
+        raise ValueError(f"Count matrices are missing events: {missing_events}")
+    os.makedirs(COUNTS_DIR, exist_ok=True)
+    out_path = COUNTS_DIR / f"{name}_counts.npz"
+    count_tensor = np.stack([count_matrices[event] for event in COUNT_EVENTS]).astype(np.int64)
+    np.savez_compressed(out_path, counts=count_tensor, events=np.array(COUNT_EVENTS))
+
+def load_count_matrices(names: list[str]) -> dict[str, npt.NDArray[np.int64]]:
+    if len(names) == 0:
+        raise ValueError("names must not be empty")
 
+    count_tensor = np.zeros((len(COUNT_EVENTS), 25, 25), dtype=np.int64)
+    for name in names:
+        file_path = COUNTS_DIR / f"{name}_counts.npz"
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"Count matrices not found: {file_path}")
+        with np.load(file_path) as data:
+            if data["events"].tolist() != COUNT_EVENTS:
+                raise ValueError(f"Events in {file_path} do not match the current event list.")
+            count_tensor += data["counts"]
+    return {event: count_tensor[i] for i, event in enumerate(COUNT_EVENTS)}
+
+@profiled("build_model")
 def build_model(count_matrices: dict[str, npt.NDArray[np.int64]]) -> Model:
     model: Model = {}
 
@@ -40,6 +82,56 @@ def build_model(count_matrices: dict[str, npt.NDArray[np.int64]]) -> Model:
 
     return model
 
+def sample_model_replicates(
+    count_matrices: dict[str, npt.NDArray[np.int64]],
+    num_replicates: int = 1000,
+    rng: np.random.Generator | int | None = None,
+) -> npt.NDArray[np.float64]:
+    # 遷移回数をもとに、各行の遷移確率をディリクレ分布からサンプリングしたモデルを作る
+    # 戻り値: (num_replicates, len(RESULT_MAPPING), 25, 25)  (打席結果の順序は RESULT_MAPPING の順)
+    if num_replicates <= 0:
+        raise ValueError("num_replicates must be positive")
+    rng = np.random.default_rng(rng)
+
+    count_tensor = np.zeros((len(RESULT_MAPPING), 25, 25), dtype=np.float64)
+    for i, events in enumerate(RESULT_MAPPING.values()):
+        for event in events:
+            count_tensor[i] += count_matrices[event]
+
+    # 合計が0の行は build_model と同じく対角成分1に置換
+    result_idx, zero_rows = np.nonzero(count_tensor.sum(axis=2) == 0)
+    count_tensor[result_idx, zero_rows, zero_rows] = 1
+
+    # ガンマ分布の標本を行ごとに正規化するとディリクレ分布の標本になる
+    # 観測されなかった遷移は形状母数0なので常に0のまま
+    samples = rng.gamma(count_tensor, size=(num_replicates,) + count_tensor.shape)
+    row_sums = samples.sum(axis=3, keepdims=True)
+    return samples / row_sums
+
+@profiled("build_strategy_model")
+def build_strategy_model(
+    count_matrices: dict[str, npt.NDArray[np.int64]],
+    min_count: int = 20,
+) -> Model:
+    # 作戦ごとの遷移確率行列
+    # 試行回数がmin_count未満の状態では作戦を選べないものとして、行を0のままにする
+    if min_count <= 0:
+        raise ValueError("min_count must be positive")
+
+    strategy_model: Model = {}
+    for strategy, events in STRATEGY_MAPPING.items():
+        count_matrix = np.zeros((25, 25), dtype=np.int64)
+        for event in events:
+            count_matrix += count_matrices[event]
+        count_matrix[24] = 0 # 3アウトからは作戦を選べない
+
+        row_sums = count_matrix.sum(axis=1, keepdims=True)
+        prob_matrix = np.zeros((25, 25), dtype=np.float64)
+        np.divide(count_matrix, row_sums, out=prob_matrix, where=row_sums >= min_count)
+        strategy_model[strategy] = prob_matrix
+
+    return strategy_model
+
 def save_model(model: Model, model_name: str) -> None:
     os.makedirs(ARTIFACTS_DIR, exist_ok=True)
     out_path = ARTIFACTS_DIR / f"{model_name}_model.npz"
@@ -1,3 +1,3 @@
-from .stats_loader import load_stats_csv
-from .builder import convert_stats_to_probs, build_lineup_matrices
-from .stats_utils import pick_lineup, validate_and_fill_stats, get_formatted_stats
+from .stats_loader import load_stats_csv, load_league_stats
+from .builder import convert_stats_to_probs, build_lineup_matrices, build_lineup_transitions, build_player_tensor, clear_player_matrix_cache
+from .stats_utils import pick_lineup, pick_regular_lineup, validate_and_fill_stats, get_formatted_stats
@@ -1,8 +1,19 @@
+import hashlib
+from collections import OrderedDict
+from typing import Callable
 import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import src.common as cmn
 from .stats_utils import validate_and_fill_stats
 
+# 選手行列のLRUキャッシュ (モデルのハッシュ, 打席結果の確率) -> 選手行列
+PLAYER_CACHE_SIZE = 4096
+_player_matrix_cache: OrderedDict[tuple[str, bytes], cmn.Matrix] = OrderedDict()
+# モデルのキー -> (打席結果の順序, 重ねたモデル)
+MODEL_CACHE_SIZE = 16
+_model_tensor_cache: dict[str, tuple[list[str], npt.NDArray[np.float64]]] = {}
+
 def convert_stats_to_probs(lineup_stats: pd.DataFrame) -> pd.DataFrame:
     stats = validate_and_fill_stats(lineup_stats)
 
@@ -40,24 +51,126 @@ def convert_stats_to_probs(lineup_stats: pd.DataFrame) -> pd.DataFrame:
 
     return probs
 
-def build_lineup_matrices(transition_model: cmn.Model, lineup_probs: pd.DataFrame) -> list[cmn.Matrix]:
-    model_results = set(transition_model.keys())
-    probs_results = set(lineup_probs.columns)
-    missing_results = model_results - probs_results
-    if missing_results:
-        raise ValueError(f"Lineup probabilities are missing results: {missing_results}")
+def build_lineup_matrices(
+    transition_model: cmn.Model | dict[str, cmn.SparseTransition],
+    lineup_probs: pd.DataFrame | npt.NDArray[np.float64],
+    model_key: str | None = None,
+) -> list[cmn.Matrix]:
+    # lineup_probs に配列 (打者数, 打席結果数) を渡す場合、列は transition_model のキーの順とする
+    # model_key: モデルを識別するキー(モデルアーティファクトのハッシュなど)
+    #   指定すると、モデルの結合とハッシュ計算は最初の1回だけになる(同じ打順を何度も作る場合に指定する)
+    results, model_tensor, model_key = _prepare_model(transition_model, model_key)
+    probs = _select_probs(lineup_probs, results)
+    keys = [(model_key, row.tobytes()) for row in probs]
 
-    lineup_matrices = []
-    for idx, row in lineup_probs.iterrows():
-        player_matrix = np.zeros((25, 25), dtype=np.float64)
-        for result, transition_matrix in transition_model.items():
-            prob = row[result]
-            player_matrix += transition_matrix * prob
-        try:
-            player_matrix = cmn.normalize_transition_matrix(player_matrix)
-        except Exception as e:
-            player_name = row.get("Name", f"Batter {idx}")
-            raise ValueError(f"Error normalizing player matrix for {player_name}") from e
-        lineup_matrices.append(player_matrix)
+    # キャッシュにない選手だけをまとめて作る
+    missing = [i for i, key in enumerate(keys) if key not in _player_matrix_cache]
+    if missing:
+        player_tensor = _build_player_tensor(
+            model_tensor, probs[missing], lambda i: _player_name(lineup_probs, missing[i])
+        )
+        for i, player_matrix in zip(missing, player_tensor):
+            _player_matrix_cache[keys[i]] = player_matrix
+            while len(_player_matrix_cache) > PLAYER_CACHE_SIZE:
+                _player_matrix_cache.popitem(last=False)
 
+    lineup_matrices = []
+    for key in keys:
+        _player_matrix_cache.move_to_end(key)
+        lineup_matrices.append(_player_matrix_cache[key].copy())
     return lineup_matrices
+
+def build_lineup_transitions(
+    transition_model: cmn.Model | dict[str, cmn.SparseTransition],
+    lineup_probs: pd.DataFrame | npt.NDArray[np.float64],
+    model_key: str | None = None,
+) -> cmn.SparseTransition:
+    # 打順の選手行列を重ねた疎行列 (simulate_states_fast, solve_run_expectancies にそのまま渡せる)
+    return cmn.to_sparse(np.stack(build_lineup_matrices(transition_model, lineup_probs, model_key)))
+
+def build_player_tensor(
+    transition_model: cmn.Model | dict[str, cmn.SparseTransition],
+    player_probs: pd.DataFrame,
+) -> npt.NDArray[np.float64]:
+    # リーグ全体の選手行列を一度に作る
+    # 戻り値: (選手数, 25, 25)
+    results, model_tensor = _stack_model(transition_model)
+    probs = _select_probs(player_probs, results)
+    return _build_player_tensor(model_tensor, probs, lambda i: _player_name(player_probs, i))
+
+def clear_player_matrix_cache() -> None:
+    _player_matrix_cache.clear()
+    _model_tensor_cache.clear()
+
+def _prepare_model(
+    transition_model: cmn.Model | dict[str, cmn.SparseTransition],
+    model_key: str | None,
+) -> tuple[list[str], npt.NDArray[np.float64], str]:
+    # 戻り値は (打席結果の順序, 重ねたモデル, キャッシュのキー)
+    if model_key is not None and model_key in _model_tensor_cache:
+        results, model_tensor = _model_tensor_cache[model_key]
+        return results, model_tensor, model_key
+    results, model_tensor = _stack_model(transition_model)
+    if model_key is None:
+        return results, model_tensor, _hash_model_tensor(results, model_tensor)
+    _model_tensor_cache[model_key] = (results, model_tensor)
+    while len(_model_tensor_cache) > MODEL_CACHE_SIZE:
+        _model_tensor_cache.pop(next(iter(_model_tensor_cache)))
+    return results, model_tensor, model_key
+
+def _select_probs(
+    player_probs: pd.DataFrame | npt.NDArray[np.float64],
+    results: list[str],
+) -> npt.NDArray[np.float64]:
+    if isinstance(player_probs, pd.DataFrame):
+        missing_results = set(results) - set(player_probs.columns)
+        if missing_results:
+            raise ValueError(f"Lineup probabilities are missing results: {missing_results}")
+        # 列ごとに取り出す方が player_probs[results] より速い
+        return np.column_stack([player_probs[r].to_numpy(dtype=np.float64) for r in results])
+    probs = np.asarray(player_probs, dtype=np.float64)
+    if probs.ndim != 2 or probs.shape[1] != len(results):
+        raise ValueError(f"Lineup probabilities must be of shape (n_players, {len(results)})")
+    return probs
+
+def _player_name(player_probs: pd.DataFrame | npt.NDArray[np.float64], i: int) -> str:
+    if isinstance(player_probs, pd.DataFrame):
+        return player_probs.iloc[i].get("Name", f"Batter {player_probs.index[i]}")
+    return f"Batter {i}"
+
+def _stack_model(
+    transition_model: cmn.Model | dict[str, cmn.SparseTransition],
+) -> tuple[list[str], npt.NDArray[np.float64]]:
+    results = list(transition_model.keys())
+    # 25x25の行列の和は密行列のまま計算する方が速い
+    model_tensor = np.stack([
+        cmn.to_dense(transition_model[r])[0] if isinstance(transition_model[r], cmn.SparseTransition)
+        else transition_model[r]
+        for r in results
+    ]).astype(np.float64)
+    return results, model_tensor
+
+def _hash_model_tensor(results: list[str], model_tensor: npt.NDArray[np.float64]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(",".join(results).encode())
+    digest.update(np.ascontiguousarray(model_tensor).tobytes())
+    return digest.hexdigest()
+
+def _build_player_tensor(
+    model_tensor: npt.NDArray[np.float64],
+    probs: npt.NDArray[np.float64],
+    player_name: Callable[[int], str],
+) -> npt.NDArray[np.float64]:
+    # player_name: probs の行番号から、エラーメッセージに使う選手名を返す関数
+    player_tensor = np.einsum("pr,rij->pij", probs, model_tensor)
+
+    # 行ごとに正規化(normalize_transition_matrix と同じ処理)
+    row_sums = player_tensor.sum(axis=2, keepdims=True)
+    invalid_players = np.where((row_sums <= 0).any(axis=(1, 2)))[0]
+    if invalid_players.size > 0:
+        i = invalid_players[0]
+        try:
+            cmn.normalize_transition_matrix(player_tensor[i])
+        except ValueError as e:
+            raise ValueError(f"Error normalizing player matrix for {player_name(i)}") from e
+    return player_tensor / row_sums
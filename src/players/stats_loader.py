@@ -43,3 +43,21 @@ def load_stats_csv(file_path: str | Path) -> pd.DataFrame:
         df.insert(0, "Name", [f"Player {i+1}" for i in range(len(df))])
 
     return df
+
+def load_league_stats(directory: str | Path, pattern: str = "*.csv") -> dict[str, pd.DataFrame]:
+    # ディレクトリ内のCSVをチームごとに読み込む
+    # チーム名はファイル名の最後の "_" 以降 (stats_2025_LAD.csv -> LAD)
+    directory = Path(directory)
+    if not directory.is_dir():
+        raise FileNotFoundError(f"Directory not found: {directory}")
+    paths = sorted(directory.glob(pattern))
+    if not paths:
+        raise FileNotFoundError(f"No CSV files matching '{pattern}' in {directory}")
+
+    league = {}
+    for path in paths:
+        team = path.stem.rsplit("_", 1)[-1]
+        if team in league:
+            raise ValueError(f"Duplicate team name: {team} ({path.name})")
+        league[team] = load_stats_csv(path)
+    return league
@@ -36,6 +36,21 @@ def pick_lineup(stats_df: pd.DataFrame, batting_order: list[int | str]) -> pd.Da
     lineup_df = pd.DataFrame(picked_rows).reset_index(drop=True)
     return lineup_df
 
+def pick_regular_lineup(stats_df: pd.DataFrame, n_batters: int = 9) -> pd.DataFrame:
+    # 打席数の多い順に n_batters 人を選ぶ(打順も打席数の順)
+    # 順位(Rk)が空欄の行はチーム合計などの集計行として除く
+    if n_batters <= 0:
+        raise ValueError("n_batters must be positive")
+    stats = validate_and_fill_stats(stats_df)
+    if "rk" in stats.columns:
+        stats = stats[stats["rk"].notna()]
+    stats = stats[stats["PA"] - stats["IBB"] - stats["SH"] > 0]
+    if len(stats) < n_batters:
+        raise ValueError(f"Not enough players with plate appearances: {len(stats)} < {n_batters}")
+
+    lineup_df = stats.sort_values("PA", ascending=False, kind="stable").head(n_batters)
+    return lineup_df.reset_index(drop=True)
+
 def validate_and_fill_stats(stats_df: pd.DataFrame) -> pd.DataFrame:
     stats = stats_df.copy()
 